@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from llama_index.core.schema import Document, QueryBundle # type: ignore
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def get_document_set_key(documents: Dict[str, List[Document]]) -> str:
+    """Hash of every loaded file's name and text, independent of upload order or time"""
+    digest = hashlib.sha256()
+    for name in sorted(documents):
+        digest.update(name.encode("utf-8") + b"\x00")
+        for doc in documents[name]:
+            digest.update(hashlib.sha256(doc.text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def get_cache_question(query_bundle: QueryBundle) -> str:
+    """The standalone question when retrieval has one, else the full prompt"""
+    if query_bundle.custom_embedding_strs:
+        return query_bundle.custom_embedding_strs[0]
+    return query_bundle.query_str
+
+
+class AnswerCache:
+    """LLM answers by document set and normalized question, with TTL and LRU eviction.
+
+    With a similarity threshold and an embedding model, a question that misses
+    on exact text is also matched against the cached questions for the same
+    document set, and reuses the answer of the closest one at or above the
+    threshold.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0,
+                 similarity_threshold: Optional[float] = None, embed_model=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold if embed_model is not None else None
+        self.embed_model = embed_model
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # key -> (created, document_set_key, question vector or None, answer)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(document_set_key: str, question: str) -> str:
+        payload = f"{document_set_key}\x00{normalize_question(question)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, document_set_key: str, question: str) -> Optional[str]:
+        key = self.key(document_set_key, question)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if e[1] == document_set_key and e[2] is not None]
+        if self.similarity_threshold is None or not candidates:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Embedded outside the lock; the query embedding is reused by retrieval on a miss
+        vector = self.embed_question(question)
+        similarity = np.stack([e[2] for _, e in candidates]) @ vector
+        best = int(similarity.argmax())
+        with self._lock:
+            if similarity[best] >= self.similarity_threshold:
+                matched_key, entry = candidates[best]
+                if matched_key in self._entries:
+                    self._entries.move_to_end(matched_key)
+                self.hits += 1
+                self.semantic_hits += 1
+                return entry[3]
+            self.misses += 1
+        return None
+
+    def put(self, document_set_key: str, question: str, answer: str) -> None:
+        if not answer:
+            return
+        vector = self.embed_question(question) if self.similarity_threshold is not None else None
+        key = self.key(document_set_key, question)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), document_set_key, vector, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def embed_question(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embed_model.get_query_embedding(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+    def _expire(self) -> None:
+        # Entries are in recency order, not age order, so check them all
+        cutoff = time.monotonic() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry[0] < cutoff]
+        for key in expired:
+            del self._entries[key]
+
+
+def get_answer_cache(embed_model=None) -> Optional[AnswerCache]:
+    """Build the answer cache from environment settings, or None if disabled"""
+    max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    if max_entries <= 0:
+        return None
+    similarity = os.getenv("ANSWER_CACHE_SIMILARITY")
+    return AnswerCache(
+        max_entries=max_entries,
+        ttl=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        similarity_threshold=float(similarity) if similarity else None,
+        embed_model=embed_model
+    )
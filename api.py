@@ -1,20 +1,51 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest # type: ignore
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 import os
 import json
-import shutil
-import requests
-from datetime import datetime
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Document # type: ignore
-from llama_index.core.response_synthesizers import ResponseMode # type: ignore
-from llama_index.core.node_parser import SentenceSplitter # type: ignore
-from main import get_llm_settings
+import asyncio
+from llama_index.core.base.response.schema import Response # type: ignore
+from main import get_llm_settings, warm_up
+from embedding_cache import CachedEmbedding
+from conversation import build_query_bundle
+from hybrid import get_retrieval_top_k
+from ingest import (artifact_key, build_index, build_nodes, get_display_name, index_ingested,
+                    ingest_files, load_artifact, load_documents, save_artifact)
+from answer_cache import get_answer_cache, get_cache_question, get_document_set_key
+from ats import JobProfile, JobProfileCache, create_analysis_prompt, format_analysis, score_resume_text
+import metrics
+import profiles
+import prompts
+import search
+import storage
+from sessions import DEFAULT_SESSION_ID, Session, SessionMemoryError, get_session_registry
+from uploads import UploadTooLargeError, get_upload_store
+from workers import StageSaturatedError, get_stage_limiter
+# Re-exported for callers that still import the client helpers from here
+from client import get_ats_score, get_ats_scores_batch # noqa: F401
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI()
+# Seconds spent in each startup phase, reported at startup and on /health
+startup_timings = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optionally load the embedding model before taking traffic instead of on first use
+    if os.getenv("WARMUP_ON_STARTUP", "").lower() in ("1", "true", "yes"):
+        startup_timings["warm_up"] = await ingest_stage.run(warm_up, settings)
+    startup_timings["total"] = time.perf_counter() - IMPORT_STARTED
+    print("Startup timings: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in startup_timings.items()))
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -23,279 +54,648 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-LLM-Tokens"],
 )
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Refuse oversized uploads from their Content-Length, before the body is read"""
+    try:
+        upload_store.check_content_length(request.headers.get("content-length"))
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+    return await call_next(request)
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """Report where each request's time went in a Server-Timing header, and its
+    LLM calls and tokens in an X-LLM-Tokens header"""
+    timings = {}
+    usage = {"calls": 0, "prompt": 0, "completion": 0}
+    token = metrics.request_timings.set(timings)
+    tokens_token = metrics.request_tokens.set(usage)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.request_timings.reset(token)
+        metrics.request_tokens.reset(tokens_token)
+    # Streamed responses only include the stages and calls that ran before the first byte
+    timings["total"] = time.perf_counter() - start
+    response.headers["Server-Timing"] = metrics.format_server_timing(timings)
+    response.headers["X-LLM-Tokens"] = metrics.format_token_usage(usage)
+    return response
+
+startup_timings["import"] = time.perf_counter() - IMPORT_STARTED
+settings_started = time.perf_counter()
 settings = get_llm_settings(contect_window=4096, max_new_token=1024)
+startup_timings["settings"] = time.perf_counter() - settings_started
 
-# Create a directory to store uploaded files
+# Uploaded files, stored once per content hash
 UPLOAD_DIR = "uploaded_files"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+upload_store = get_upload_store(UPLOAD_DIR)
 
 class ChatMessage(BaseModel):
     human: str
     assistant: str
 
-class ChatRequest(BaseModel):
-    chat_history: List[ChatMessage] = []
-    message: str
-
-# Dictionary to store document metadata and indices
-doc_store = {
-    "documents": {},  # Map file names to Document objects
-    "indices": {},    # Map file names to indices
-    "combined_index": None  # For all documents combined
-}
-
-def save_uploaded_file(uploaded_file: UploadFile) -> str:
-    # Generate a unique filename using timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{uploaded_file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-
-    # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(uploaded_file.file, buffer)
-
-    return file_path, filename
-
-def process_multiple_files(file_paths):
-    """Process multiple files and create individual and combined indices"""
-    all_documents = []
-    doc_store["documents"] = {}
-    doc_store["indices"] = {}
-    
-    # Process each file individually
-    for file_path, original_name in file_paths:
-        # Extract just the filename without timestamp
-        if '_' in original_name:
-            display_name = original_name.split('_', 1)[1]  # Get part after timestamp
-        else:
-            display_name = original_name
-            
-        # Load document
-        documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
-        # Add metadata to track source file
-        for doc in documents:
-            doc.metadata["file_name"] = display_name
-            
-        # Store document and create individual index
-        doc_store["documents"][display_name] = documents
-        doc_store["indices"][display_name] = VectorStoreIndex.from_documents(
-            documents=documents, 
-            service_context=settings
-        )
-        all_documents.extend(documents)
+# Directory for persistent indices; None keeps everything in memory
+STORAGE_DIR = storage.get_storage_dir()
+
+# Each session owns its own document store and query engine
+sessions = get_session_registry(STORAGE_DIR)
+
+# Index memory and document counts are read from the live sessions on each scrape
+metrics.INDEX_MEMORY_BYTES.set_function(lambda: sessions.stats()["memory_bytes"])
+metrics.DOC_STORE_FILES.set_function(lambda: sessions.stats()["documents"])
+metrics.LIVE_SESSIONS.set_function(lambda: sessions.stats()["sessions"])
+metrics.install_stage_timing()
+
+# Blocking work is bounded per stage and kept off the event loop
+ingest_stage = get_stage_limiter("ingest", default_concurrency=2, default_queue=8)
+query_stage = get_stage_limiter("query", default_concurrency=8, default_queue=32)
+ats_stage = get_stage_limiter("ats", default_concurrency=4, default_queue=200)
+
+# Answers to repeated questions over the same resumes, by document set and question
+answer_cache = get_answer_cache(settings.embed_model)
+
+# Parsed terms and embeddings of registered job descriptions, by job ID
+job_profiles = JobProfileCache(max_entries=int(os.getenv("ATS_JOB_CACHE_SIZE", "128")))
+
+async def save_uploaded_files(uploaded_files: List[UploadFile]) -> List[tuple]:
+    """Stream uploads into the store, pinned until release_uploads; returns (file_path, file name) pairs"""
+    saved = []
+    try:
+        for uploaded_file in uploaded_files:
+            saved.append(await upload_store.save(uploaded_file))
+    except Exception:
+        release_uploads(saved)
+        raise
+    return saved
+
+def release_uploads(file_paths: Optional[List[tuple]], delete: bool = False) -> None:
+    """Unpin uploads once a request is done with them, optionally deleting any nobody else uses"""
+    if not file_paths:
+        return
+    paths = [file_path for file_path, _ in file_paths]
+    upload_store.unpin(paths)
+    if delete:
+        upload_store.delete_unused(paths, sessions.file_paths())
+
+def add_session_documents(session: Session, file_paths):
+    """Add files to a session's live store, returning added and failed files with timings"""
+    with session.lock:
+        return session.add_documents(file_paths)
+
+def process_multiple_files(file_paths, session: Optional[Session] = None):
+    """Process multiple files and create individual and combined indices;
+    returns the query engine and the display names the files were added under"""
+    session = session or sessions.get()
+    session.reset()
     
-    # Create combined index for all documents
-    doc_store["combined_index"] = VectorStoreIndex.from_documents(
-        documents=all_documents,
-        service_context=settings
-    )
+    # Parse files in parallel, then chunk and embed each once, inserting into the combined index
+    result = session.add_documents(file_paths)
     
-    return doc_store["combined_index"].as_query_engine(
-        response_mode=ResponseMode.TREE_SUMMARIZE
-    )
+    return session.get_query_engine(), result["added"]
+
+RANKING_KEYWORDS = ["rank", "sort", "order", "best", "top", "compare", "better"]
+
+RANKING_FORMAT = """
+Please provide your analysis in a structured format:
+
+1. COMPARISON SUMMARY: Brief overview of how the resumes compare
+2. INDIVIDUAL ASSESSMENTS: For each resume, provide key strengths/weaknesses
+3. RANKING: If requested, provide a ranked list with justification for each position
+4. RECOMMENDATION: Which candidate(s) might be best suited and why
+"""
 
 def create_comparison_prompt(message, files):
-    """Create a prompt specifically for comparing multiple resumes"""
-    base_prompt = f"""
-    I have {len(files)} different resumes/CVs to analyze. 
-    
+    """Create a prompt specifically for comparing multiple resumes.
+
+    The prompt is fitted to the token budget: the output format for ranking
+    questions is dropped first, then the instructions are shortened.
+    """
+    instructions = f"""
+    I have {len(files)} different resumes/CVs to analyze.
+
     The file names are: {', '.join(files)}
-    
+
     For comparison purposes, please maintain awareness of which details come from which resume.
     When analyzing multiple resumes, please:
     1. Compare key skills, experience, and qualifications across candidates
     2. Identify relative strengths and weaknesses
     3. If asked to rank or rate candidates, provide clear justification
-    
-    My question is: {message}
     """
-    return base_prompt
+    # For ranking/sorting queries, add structured instruction
+    ranking = any(keyword in message.lower() for keyword in RANKING_KEYWORDS)
+    return prompts.fit_prompt(f"My question is: {message}", instructions, RANKING_FORMAT if ranking else "")
 
-def chat_with_llama(chat_history: List[ChatMessage], message: str, file_paths: Optional[List[tuple]] = None):
-    global query_engine
-    
-    # Initialize default query engine if needed
-    if 'query_engine' not in globals():
-        empty_documents = []
-        index = VectorStoreIndex.from_documents(documents=empty_documents, service_context=settings)
-        query_engine = index.as_query_engine()
-    
-    # Prepare context from chat history
-    context = "\n".join([f"<|USER|>{item.human}\n<|ASSISTANT|>{item.assistant}" for item in chat_history[-10:]])
+def chat_with_llama(chat_history: List[ChatMessage], message: str, file_paths: Optional[List[tuple]] = None,
+                    session_id: str = DEFAULT_SESSION_ID):
+    session = sessions.get(session_id)
+    query_engine, query_bundle, cache_key, cached = prepare_session_query(
+        session, chat_history, message, file_paths
+    )
+    if cached is not None:
+        return Response(cached)
+    response = query_engine.query(query_bundle)
+    remember_answer(cache_key, str(response))
+    return response
+
+async def achat_with_llama(chat_history: List[ChatMessage], message: str, file_paths: Optional[List[tuple]] = None,
+                           session_id: str = DEFAULT_SESSION_ID):
+    """Async chat: ingest runs on the ingest pool, the LLM call through aquery"""
+    session = sessions.get(session_id)
+    # Follow-up questions must not queue behind another user's resume batch
+    stage = ingest_stage if file_paths else query_stage
+    query_engine, query_bundle, cache_key, cached = await stage.run(
+        prepare_session_query, session, chat_history, message, file_paths
+    )
+    if cached is not None:
+        return Response(cached)
+    response = await query_stage.run_async(query_engine.aquery, query_bundle)
+    remember_answer(cache_key, str(response))
+    return response
+
+async def astream_chat_with_llama(chat_history: List[ChatMessage], message: str, file_paths: Optional[List[tuple]] = None,
+                                  session_id: str = DEFAULT_SESSION_ID):
+    """Ingest like achat_with_llama, then return an async iterator of answer tokens.
+
+    A saturated query stage is refused before returning so the client still
+    gets a 429, but the slot itself is only taken once the stream is read and
+    is held until it is exhausted or closed; a stream that is never started
+    (say, the client left before the first byte) holds nothing.
+    A cached answer is returned as a single token without taking a slot.
+    """
+    session = sessions.get(session_id)
+    stage = ingest_stage if file_paths else query_stage
+    query_engine, query_bundle, cache_key, cached = await stage.run(
+        prepare_session_query, session, chat_history, message, file_paths, streaming=True
+    )
+    if cached is not None:
+        async def cached_tokens():
+            yield cached
+        return cached_tokens()
+
+    query_stage.check()
+
+    async def tokens():
+        answer = []
+        async with query_stage.slot():
+            response = await query_stage.call(query_engine.query, query_bundle)
+            # An empty index answers with a plain Response rather than a stream
+            if getattr(response, "response_gen", None) is None:
+                answer.append(str(response))
+                yield str(response)
+            else:
+                async for token in query_stage.iterate(response.response_gen):
+                    answer.append(token)
+                    yield token
+        # Only complete answers are cached, not ones cut short by a disconnect
+        remember_answer(cache_key, "".join(answer))
+
+    return tokens()
+
+def prepare_session_query(session: Session, chat_history: List[ChatMessage], message: str,
+                          file_paths: Optional[List[tuple]] = None, streaming: bool = False):
+    """prepare_query under the session lock, plus the answer cache key and any cached answer"""
+    with session.lock:
+        query_engine, query_bundle = prepare_query(session, chat_history, message, file_paths, streaming)
+        cache_key = (get_document_set_key(session.doc_store["documents"]), get_cache_question(query_bundle))
+    cached = answer_cache.get(*cache_key) if answer_cache is not None else None
+    return query_engine, query_bundle, cache_key, cached
+
+def remember_answer(cache_key, answer: str) -> None:
+    if answer_cache is not None:
+        answer_cache.put(*cache_key, answer)
+
+def prepare_query(session: Session, chat_history: List[ChatMessage], message: str,
+                  file_paths: Optional[List[tuple]] = None, streaming: bool = False):
+    """Ingest any new files and build the query; returns (query_engine, query_bundle).
+
+    The LLM sees a token-budgeted slice of the chat history, while retrieval
+    only embeds a standalone rewrite of the message (see conversation.py).
+    """
+    query_engine = session.get_query_engine()
+    prompt = message
     
     # If this is a multiple file analysis, use special handling
-    if file_paths and len(file_paths) > 1:
+    if file_paths:
         # Process the files and create indices
-        query_engine = process_multiple_files(file_paths)
-        
-        # Extract just the file names for the prompt
-        file_names = [original_name.split('_', 1)[1] if '_' in original_name else original_name 
-                      for _, original_name in file_paths]
-        
-        # Create comparison-specific prompt
-        comparison_prompt = create_comparison_prompt(message, file_names)
+        query_engine, file_names = process_multiple_files(file_paths, session)
         
-        # For ranking/sorting queries, add structured instruction
-        if any(keyword in message.lower() for keyword in 
-              ["rank", "sort", "order", "best", "top", "compare", "better"]):
-            comparison_prompt += """
-            Please provide your analysis in a structured format:
-            
-            1. COMPARISON SUMMARY: Brief overview of how the resumes compare
-            2. INDIVIDUAL ASSESSMENTS: For each resume, provide key strengths/weaknesses
-            3. RANKING: If requested, provide a ranked list with justification for each position
-            4. RECOMMENDATION: Which candidate(s) might be best suited and why
-            """
-        
-        full_query = f"{context}\n<|USER|>{comparison_prompt}<|ASSISTANT|>"
-    # Single file upload or continued conversation    
-    else:
-        # If a single file was uploaded, process it
-        if file_paths and len(file_paths) == 1:
-            file_path, original_name = file_paths[0]
-            documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
-            index = VectorStoreIndex.from_documents(documents=documents, service_context=settings)
-            query_engine = index.as_query_engine()
-            
-        full_query = f"{context}\n<|USER|>{message}<|ASSISTANT|>"
+        # Create comparison-specific prompt over the files that were actually ingested
+        if len(file_names) > 1:
+            prompt = create_comparison_prompt(message, file_names)
     
-    # Query the engine
-    response = query_engine.query(full_query)
-    return response
-def get_ats_score(job_description, resume_data, api_url):
-    """Get ATS score for a resume compared to a job description"""
-    try:
-        # Create a structured prompt for deterministic scoring
-        structured_prompt = f"""
-        Please analyze this resume against the job description. 
-        
-        Extract all relevant keywords from the job description and check if they exist in the resume.
-        Use the following scoring method:
-        1. Calculate exact keyword matches (weighted at 70%)
-        2. Calculate semantic/synonym matches (weighted at 30%)
-        3. Provide a final percentage score
-        
-        Format your response exactly as follows:
-        SCORE: [0-100]
-        MATCHED KEYWORDS: [comma-separated list]
-        MISSING KEYWORDS: [comma-separated list]
-        ANALYSIS: [brief explanation]
-        
-        JOB DESCRIPTION:
-        {job_description}
-        """
-        
-        # Create data for API request
-        data = {
-            "message": structured_prompt,
-            "chat_history": []  # Empty to ensure consistency
-        }
-        
-        # Package the resume for sending
-        files = {
-            "file": (
-                resume_data["name"], 
-                resume_data["content"], 
-                resume_data["type"]
-            )
-        }
-        
-        # Send to API
-        response = requests.post(
-            f"{api_url}/chat",
-            data={"data": json.dumps(data)},
-            files=files
+    query_bundle = build_query_bundle(chat_history, message, prompt)
+    if streaming:
+        query_engine = session.get_combined_query_engine(streaming=True)
+    return query_engine, query_bundle
+
+def score_resume(job_description, file_path, original_name, profile: Optional[JobProfile] = None,
+                 analysis: bool = True):
+    """Score one saved resume against a job description, outside any chat session.
+
+    The score and keyword lists come from the local ATS engine; the LLM is only
+    asked for the narrative ANALYSIS, and skipped entirely when analysis is False.
+    """
+    display_name = get_display_name(original_name)
+    profile = profile or job_profiles.register(job_description, settings.embed_model)
+    # A resume that was ingested before is neither parsed nor embedded again
+    key = artifact_key(file_path, display_name)
+    artifact = load_artifact(key, file_path)
+    if artifact is not None:
+        documents, nodes = artifact
+    else:
+        with metrics.timed("parse"):
+            documents = load_documents(file_path, display_name)
+        nodes = None
+    text = "\n".join(doc.text for doc in documents)
+    with metrics.timed("ats_score"):
+        result = score_resume_text(profile, text, settings.embed_model)
+    # Extracted once per file and read back from the profile store afterwards
+    resume_profile = profiles.get_profile(key, display_name, text)
+
+    narrative = ""
+    if analysis:
+        if nodes is None:
+            nodes = build_nodes(documents)
+            save_artifact(key, documents, nodes)
+        index_ingested(key, display_name, documents, nodes)
+        query_engine = build_index(nodes).as_query_engine(
+            similarity_top_k=get_retrieval_top_k(),
+            node_postprocessors=[prompts.TokenBudgetPostprocessor()]
         )
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        # Parse the score from the response
-        response_text = str(result["response"])
-        
-        # Extract score using regex
-        import re
-        score_match = re.search(r'SCORE:\s*(\d+)', response_text)
-        if score_match:
-            score = int(score_match.group(1))
+        prompt = create_analysis_prompt(job_description, result)
+        narrative = str(query_engine.query(f"\n<|USER|>{prompt}<|ASSISTANT|>"))
+
+    result["name"] = display_name
+    result["profile"] = {field: resume_profile[field] for field in ("years_experience", "highest_degree", "skills")}
+    result["full_analysis"] = format_analysis(result, narrative)
+    return result
+
+def add_to_pool(file_paths):
+    """Ingest files into the /search pool only, without attaching them to a session"""
+    added, failed = [], {}
+    for result in ingest_files(file_paths):
+        if "error" in result:
+            failed[result["name"]] = result["error"]
         else:
-            score = None
-            
-        return {
-            "score": score,
-            "full_analysis": response_text
-        }
-        
-    except Exception as e:
-        print(f"Error getting ATS score: {str(e)}")
-        return {"score": None, "full_analysis": f"Error: {str(e)}"}
-        return {"score": None, "full_analysis": f"Error: {str(e)}"}
+            added.append(result["name"])
+    return {"added": added, "failed": failed}
 
+def busy_error(error: StageSaturatedError) -> HTTPException:
+    """429 telling the client how deep the queue it was refused from is"""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": "5", "X-Queue-Length": str(error.queued)}
+    )
 
+def get_session(session_id: str) -> Session:
+    """Look up a session, rejecting malformed session IDs"""
+    try:
+        return sessions.get(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/")
 def home():
     return "Welcome to the Chat API!"
 
+@app.get("/health")
+def health():
+    embed_model = settings.embed_model
+    if isinstance(embed_model, CachedEmbedding):
+        embed_model = embed_model.base
+    return {
+        "status": "ok",
+        "startup_seconds": {name: round(seconds, 3) for name, seconds in startup_timings.items()},
+        "embedding_model_loaded": getattr(embed_model, "loaded", True),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+async def parse_chat_form(request: Request, data: str, file: Optional[UploadFile]):
+    """Parse the chat form fields and save any uploads; returns (chat_history, message, file_paths, session_id).
+
+    Saved uploads are pinned; the caller passes file_paths to release_uploads when done.
+    """
+    chat_request = json.loads(data)
+    message = chat_request.get('message', '')
+    chat_history = [ChatMessage(**msg) for msg in chat_request.get('chat_history', [])]
+    session_id = chat_request.get('session_id') or DEFAULT_SESSION_ID
+
+    if not message:
+        raise HTTPException(status_code=400, detail="No message provided")
+    get_session(session_id)
+
+    # Files sent as file_0, file_1, ... take precedence over a single file field
+    form_data = await request.form()
+    uploads = [form_data[key] for key in form_data.keys()
+               if key.startswith('file_') and form_data[key].filename]
+    if not uploads and file and file.filename and len(chat_history) == 0:
+        uploads = [file]
+
+    file_paths = await save_uploaded_files(uploads)
+    for file_path, original_name in file_paths:
+        print(f"File {original_name} saved at: {file_path}")
+
+    return chat_history, message, file_paths if file_paths else None, session_id
+
 @app.post("/chat")
 async def chat(request: Request, data: str = Form(...), file: Optional[UploadFile] = File(None)):
+    file_paths = None
     try:
-        chat_request = json.loads(data)
-        message = chat_request.get('message', '')
-        chat_history = [ChatMessage(**msg) for msg in chat_request.get('chat_history', [])]
-
-        if not message:
-            raise HTTPException(status_code=400, detail="No message provided")
-
-        # Check for file parameter first
-        file_paths = []
-        if file and len(chat_history) == 0:
-            file_path, original_name = save_uploaded_file(file)
-            file_paths = [(file_path, original_name)]
-            print(f"Single file saved at: {file_path}")
-        
-        # Check if request contains multiple files
-        form_data = await request.form()
-        multiple_files = []
-        
-        for key in form_data.keys():
-            if key.startswith('file_') and form_data[key].filename:
-                file_obj = form_data[key]
-                file_path, original_name = save_uploaded_file(file_obj)
-                multiple_files.append((file_path, original_name))
-                print(f"Multiple file {key} saved at: {file_path}")
-        
-        if multiple_files:
-            file_paths = multiple_files
+        chat_history, message, file_paths, session_id = await parse_chat_form(request, data, file)
 
         # Process the message with your LLM or chatbot logic here
-        response = chat_with_llama(chat_history, message, file_paths if file_paths else None)
+        response = await achat_with_llama(chat_history, message, file_paths, session_id)
         return {"response": str(response)}
+    except HTTPException:
+        raise
+    except StageSaturatedError as e:
+        raise busy_error(e)
+    except (SessionMemoryError, UploadTooLargeError) as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except json.JSONDecodeError as e:
         print(f"JSON Decode Error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
     except Exception as e:
         print(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    
+    finally:
+        # Files the session ingested stay on disk until /new_chat; anything else goes now
+        release_uploads(file_paths, delete=True)
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request, data: str = Form(...), file: Optional[UploadFile] = File(None)):
+    """Same inputs as /chat, answered as server-sent events: one `token` event per
+    chunk of text, then a `done` event (or an `error` event if generation fails)."""
+    file_paths = None
+    try:
+        chat_history, message, file_paths, session_id = await parse_chat_form(request, data, file)
+        tokens = await astream_chat_with_llama(chat_history, message, file_paths, session_id)
+    except HTTPException:
+        raise
+    except StageSaturatedError as e:
+        raise busy_error(e)
+    except (SessionMemoryError, UploadTooLargeError) as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except json.JSONDecodeError as e:
+        print(f"JSON Decode Error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        # Ingest has finished by the time tokens are streamed
+        release_uploads(file_paths, delete=True)
+
+    async def events():
+        try:
+            async for token in tokens:
+                yield sse_event("token", {"text": token})
+            yield sse_event("done", {})
+        except Exception as e:
+            print(f"Error streaming response: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def sse_event(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+class JobDescriptionRequest(BaseModel):
+    job_description: str
+
+@app.post("/ats/jobs")
+async def register_job(job_request: JobDescriptionRequest):
+    """Parse and embed a job description once; later batches refer to it by job_id"""
+    if not job_request.job_description.strip():
+        raise HTTPException(status_code=400, detail="No job description provided")
+    try:
+        profile = await ats_stage.run(job_profiles.register, job_request.job_description, settings.embed_model)
+    except StageSaturatedError as e:
+        raise busy_error(e)
+    return {"job_id": profile.job_id, "terms": profile.terms}
+
+@app.post("/ats/batch")
+async def ats_batch(request: Request, data: str = Form(...)):
+    """Score N uploaded resumes (file_* fields) against one job description,
+    given either inline as job_description or as a job_id from /ats/jobs.
+
+    Resumes are scored concurrently, at most max_workers at a time and never
+    more than the ats stage allows, and each result is streamed back as a
+    server-sent `result` event as soon as it finishes, followed by `done`.
+    Job description terms and embeddings come from the job profile cache;
+    pass "analysis": false to skip the LLM narrative and return scores only.
+    """
+    try:
+        batch_request = json.loads(data)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+
+    job_id = batch_request.get('job_id')
+    job_description = batch_request.get('job_description', '')
+    profile = job_profiles.get(job_id) if job_id else None
+    if job_id and profile is None and not job_description:
+        raise HTTPException(status_code=404, detail=f"Unknown job ID: {job_id}")
+    if profile is None and not job_description:
+        raise HTTPException(status_code=400, detail="No job description provided")
+    try:
+        max_workers = int(batch_request.get('max_workers') or ats_stage.max_concurrency)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="max_workers must be an integer")
+
+    form_data = await request.form()
+    try:
+        resumes = await save_uploaded_files([form_data[key] for key in form_data.keys()
+                                             if key.startswith('file_') and form_data[key].filename])
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not resumes:
+        raise HTTPException(status_code=400, detail="No resumes provided")
+
+    if len(resumes) > ats_stage.capacity():
+        release_uploads(resumes, delete=True)
+        raise busy_error(StageSaturatedError(ats_stage.name, ats_stage.queued))
+
+    batch_slots = asyncio.Semaphore(max(1, min(max_workers, ats_stage.max_concurrency)))
+    analysis = bool(batch_request.get('analysis', True))
+    if profile is None:
+        try:
+            profile = await ats_stage.run(job_profiles.register, job_description, settings.embed_model)
+        except StageSaturatedError as e:
+            release_uploads(resumes, delete=True)
+            raise busy_error(e)
+    job_description = profile.job_description
+
+    async def score(file_path, original_name):
+        # Released even when the task is cancelled while still waiting for a batch slot
+        try:
+            async with batch_slots:
+                return await ats_stage.run(score_resume, job_description, file_path, original_name,
+                                           profile, analysis)
+        except Exception as e:
+            print(f"Error getting ATS score: {str(e)}")
+            return {"name": get_display_name(original_name), "score": None,
+                    "full_analysis": f"Error: {str(e)}"}
+        finally:
+            release_uploads([(file_path, original_name)], delete=True)
+
+    tasks = [asyncio.ensure_future(score(file_path, original_name))
+             for file_path, original_name in resumes]
+
+    async def events():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield sse_event("result", await finished)
+            yield sse_event("done", {"count": len(tasks)})
+        finally:
+            # Stop scoring if the client goes away mid-batch
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/documents")
+def list_documents(session_id: str = DEFAULT_SESSION_ID):
+    session = get_session(session_id)
+    with session.lock:
+        session.ensure_storage_loaded()
+        return {"documents": list(session.doc_store["documents"].keys())}
+
+@app.post("/documents")
+async def add_documents(request: Request, session_id: str = DEFAULT_SESSION_ID):
+    session = get_session(session_id)
+    saved = None
+    try:
+        form_data = await request.form()
+        saved = await save_uploaded_files([form_data[key] for key in form_data.keys()
+                                           if (key == "file" or key.startswith('file_')) and form_data[key].filename])
+        for file_path, original_name in saved:
+            print(f"Document {original_name} saved at: {file_path}")
+
+        if not saved:
+            raise HTTPException(status_code=400, detail="No file provided")
+        result = await ingest_stage.run(add_session_documents, session, saved)
+        return {**result, "documents": list(session.doc_store["documents"].keys())}
+    except HTTPException:
+        raise
+    except StageSaturatedError as e:
+        raise busy_error(e)
+    except (SessionMemoryError, UploadTooLargeError) as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        release_uploads(saved, delete=True)
+
+@app.delete("/documents/{file_name}")
+def delete_document(file_name: str, session_id: str = DEFAULT_SESSION_ID):
+    session = get_session(session_id)
+    try:
+        with session.lock:
+            session.remove_document(file_name)
+            return {"removed": file_name, "documents": list(session.doc_store["documents"].keys())}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document not found: {file_name}")
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/search")
+async def search_resumes(q: str, top_k: int = 20):
+    """Rank every resume ever ingested against a query, without the LLM"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query is empty")
+    if not 1 <= top_k <= 200:
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 200")
+    try:
+        results = await query_stage.run(search.search_candidates, q, top_k)
+        return {"query": q, "results": results, "pool": search.get_candidate_index().stats()}
+    except StageSaturatedError as e:
+        raise busy_error(e)
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/search/resumes")
+async def add_search_resumes(request: Request):
+    """Add resumes to the /search pool without opening a chat session"""
+    saved = None
+    try:
+        form_data = await request.form()
+        saved = await save_uploaded_files([form_data[key] for key in form_data.keys()
+                                           if (key == "file" or key.startswith('file_')) and form_data[key].filename])
+        if not saved:
+            raise HTTPException(status_code=400, detail="No file provided")
+        result = await ingest_stage.run(add_to_pool, saved)
+        return {**result, "pool": search.get_candidate_index().stats()}
+    except HTTPException:
+        raise
+    except StageSaturatedError as e:
+        raise busy_error(e)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        release_uploads(saved, delete=True)
+
+@app.get("/profiles")
+def list_profiles(skills: str = "", min_years: Optional[float] = None, degree: Optional[str] = None,
+                  file_names: str = "", keys: str = "", limit: int = 100):
+    """Filter extracted resume profiles locally, e.g. ?skills=go,kafka&min_years=5&degree=master;
+    keys looks up /search results"""
+    store = profiles.get_profile_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="The profile store is disabled (PROFILE_STORE_DIR is empty)")
+    try:
+        results = store.find(
+            skills=[skill.strip() for skill in skills.split(",") if skill.strip()],
+            min_years=min_years,
+            degree=degree,
+            file_names=[name.strip() for name in file_names.split(",") if name.strip()],
+            keys=[key.strip() for key in keys.split(",") if key.strip()],
+            limit=max(1, min(limit, 1000))
+        )
+        return {"profiles": results, "count": len(results)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @app.post("/new_chat")
-async def new_chat():
+def new_chat(session_id: str = DEFAULT_SESSION_ID):
+    session = get_session(session_id)
     try:
-        # Reset document store
-        global doc_store
-        doc_store = {
-            "documents": {},
-            "indices": {},
-            "combined_index": None
-        }
+        with session.lock:
+            session.ensure_storage_loaded()
+            file_paths = session.file_paths()
+
+            # Reset this session's document store only
+            session.reset()
+            sessions.drop(session.session_id)
         
-        # Delete all files in the upload directory
-        for file in os.listdir(UPLOAD_DIR):
-            file_path = os.path.join(UPLOAD_DIR, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
+        # Delete the files uploaded in this session, unless another session has the same file
+        upload_store.delete_unused(file_paths, sessions.file_paths())
         return {"response": "Chat history and document store cleared."}
     except Exception as e:
         print(f"Error processing request: {str(e)}")
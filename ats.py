@@ -0,0 +1,241 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from profiles import SKILL_PATTERNS
+
+EXACT_WEIGHT = 0.7
+SEMANTIC_WEIGHT = 0.3
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-/][a-z0-9+#]+)*")
+# The same tokens with their original capitalization, for spotting acronyms and product names
+CASED_TOKEN_PATTERN = re.compile(TOKEN_PATTERN.pattern, re.IGNORECASE)
+TOKEN_PARTS = re.compile(r"[./]")
+
+# Known skills by their term, matched in resumes with the same patterns as the profile store
+SKILL_TERMS = {skill.lower(): pattern for skill, pattern in SKILL_PATTERNS}
+
+# Common English words plus the filler vocabulary of job postings, which would
+# otherwise dominate the extracted requirement terms
+STOPWORDS = frozenset("""
+a about above across after again against all also an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+either etc few for from further had has have having he her here hers how i if in into
+is it its itself just may me might more most must my no nor not of off on once only or
+other our ours out over own per same she should so some such than that the their them
+then there these they this those through to too under until up upon us very via was we
+well were what when where which while who whom why will with within without would you
+your yours
+ability able apply applicant applicants benefits best bonus candidate candidates
+closely company competitive degree demonstrated desired duties environment equivalent
+excellent experience experienced familiarity field good great help highly ideal including
+job join key knowledge least looking minimum new nice opportunity plus position preferred
+proficiency proficient proven qualifications related required requirement requirements
+responsibilities responsible role salary similar skill skills solid strong successful
+team teams understanding using work working year years
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, keeping tech spellings such as c++, c#, node.js and ci/cd"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def is_term(token: str) -> bool:
+    return token not in STOPWORDS and not token.rstrip("+").isdigit() and len(token) > 1
+
+
+def is_tech_token(token: str, line: str) -> bool:
+    """Whether a token outside the skill vocabulary still looks like a technology.
+
+    That is a spelling no ordinary word has: a digit (s3, oauth2), a +, #, . or /
+    (c++, node.js, ci/cd), a capital inside the word (GraphQL, DevOps), or a short
+    all-caps acronym (ETL, REST) on a line that isn't itself all caps (a heading).
+    """
+    lower = token.lower()
+    if not is_term(lower):
+        return False
+    if any(char in "+#./" for char in token):
+        return any(len(part) > 1 and part not in STOPWORDS for part in TOKEN_PARTS.split(lower))
+    if any(char.isdigit() for char in token):
+        return any(char.isalpha() for char in token)
+    if any(char.isupper() for char in token[1:]) and any(char.islower() for char in token):
+        return True
+    return token.isupper() and len(token) <= 5 and line != line.upper()
+
+
+def extract_terms(job_description: str) -> List[str]:
+    """Requirement terms from a job description, deduplicated in order of appearance.
+
+    Terms are the known skills the description mentions, with multi-word skills
+    such as "machine learning" kept whole, plus tech-shaped tokens (see
+    is_tech_token). Ordinary words ("hiring", "collaborate") are never terms.
+    """
+    found = []
+    for skill, pattern in SKILL_TERMS.items():
+        found.extend((match.start(), match.end(), skill) for match in pattern.finditer(job_description))
+    # Longest match first, so "Spring Boot" is one term rather than "spring" as well
+    spans = []
+    for start, end, skill in sorted(found, key=lambda item: (item[0], item[0] - item[1])):
+        if not spans or start >= spans[-1][1]:
+            spans.append((start, end, skill))
+
+    offset = 0
+    for line in job_description.splitlines(keepends=True):
+        for match in CASED_TOKEN_PATTERN.finditer(line):
+            start, end = offset + match.start(), offset + match.end()
+            if match.start() > 0 and line[match.start() - 1] in "'’":
+                continue
+            if any(start < span_end and end > span_start for span_start, span_end, _ in spans):
+                continue
+            if is_tech_token(match.group(), line):
+                spans.append((start, end, match.group().lower()))
+        offset += len(line)
+    return list(dict.fromkeys(term for _, _, term in sorted(spans)))
+
+
+def has_term(term: str, resume_text: str, resume_tokens: Set[str]) -> bool:
+    """Known skills are found by their pattern, anything else by token"""
+    pattern = SKILL_TERMS.get(term)
+    if pattern is not None:
+        return pattern.search(resume_text) is not None
+    return term in resume_tokens
+
+
+def embed_normalized(texts: List[str], embed_model) -> np.ndarray:
+    """Unit-length embedding rows for texts, so a matrix product gives cosine similarity"""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vectors = np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def get_job_id(job_description: str) -> str:
+    """Stable ID for a job description, ignoring case and whitespace differences"""
+    normalized = " ".join(job_description.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class JobProfile:
+    """Requirement terms and their embeddings, computed once per job description"""
+
+    def __init__(self, job_description: str, embed_model):
+        self.job_id = get_job_id(job_description)
+        self.job_description = job_description
+        self.terms = extract_terms(job_description)
+        self.term_vectors = embed_normalized(self.terms, embed_model)
+
+
+class JobProfileCache:
+    """LRU cache of JobProfiles by job ID, so a job description that is scored
+    against a stream of applicants is only parsed and embedded once"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, JobProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[JobProfile]:
+        with self._lock:
+            profile = self._profiles.get(job_id)
+            if profile is not None:
+                self._profiles.move_to_end(job_id)
+            return profile
+
+    def register(self, job_description: str, embed_model) -> JobProfile:
+        """Return the cached profile for a job description, building it on first sight"""
+        profile = self.get(get_job_id(job_description))
+        if profile is not None:
+            return profile
+
+        profile = JobProfile(job_description, embed_model)
+        with self._lock:
+            self._profiles[profile.job_id] = profile
+            self._profiles.move_to_end(profile.job_id)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        return profile
+
+
+def score_resume_text(profile: JobProfile, resume_text: str, embed_model,
+                      semantic_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """Deterministic ATS score for one resume.
+
+    Exact matches look each term up in the resume: known skills by their
+    pattern, other terms in its token set. Terms without an exact match are
+    compared against the resume's skills and every distinct resume word in a single
+    matrix product of embeddings, and count as semantic matches when the best
+    cosine similarity reaches the threshold. The score weights exact coverage
+    at 70% and exact-or-semantic coverage at 30%.
+    """
+    if semantic_threshold is None:
+        semantic_threshold = float(os.getenv("ATS_SEMANTIC_THRESHOLD", "0.6"))
+
+    resume_tokens = set(tokenize(resume_text))
+    exact = [has_term(term, resume_text, resume_tokens) for term in profile.terms]
+
+    semantic_matches = {}
+    unmatched = [i for i, hit in enumerate(exact) if not hit]
+    vocabulary = sorted({token for token in resume_tokens if is_term(token)} |
+                        {skill for skill, pattern in SKILL_TERMS.items() if pattern.search(resume_text)})
+    if unmatched and vocabulary:
+        vocabulary_vectors = embed_normalized(vocabulary, embed_model)
+        similarity = profile.term_vectors[unmatched] @ vocabulary_vectors.T
+        best = similarity.argmax(axis=1)
+        for row, term_index in enumerate(unmatched):
+            if similarity[row, best[row]] >= semantic_threshold:
+                semantic_matches[profile.terms[term_index]] = vocabulary[best[row]]
+
+    total = len(profile.terms)
+    exact_count = sum(exact)
+    covered_count = exact_count + len(semantic_matches)
+    if total:
+        score = round(100 * (EXACT_WEIGHT * exact_count + SEMANTIC_WEIGHT * covered_count) / total)
+    else:
+        score = None
+
+    return {
+        "score": score,
+        "matched_keywords": [term for term, hit in zip(profile.terms, exact) if hit],
+        "semantic_matches": semantic_matches,
+        "missing_keywords": [term for term, hit in zip(profile.terms, exact)
+                             if not hit and term not in semantic_matches]
+    }
+
+
+def create_analysis_prompt(job_description: str, result: Dict[str, Any]) -> str:
+    """Ask the LLM only for the narrative, giving it the already computed match"""
+    semantic = ", ".join(f"{term} ~ {match}" for term, match in result["semantic_matches"].items())
+    return f"""
+        This resume has already been scored against the job description.
+
+        SCORE: {result["score"]}
+        MATCHED KEYWORDS: {", ".join(result["matched_keywords"])}
+        RELATED KEYWORDS: {semantic}
+        MISSING KEYWORDS: {", ".join(result["missing_keywords"])}
+
+        Do not change the score. Write a brief analysis (3-5 sentences) of how well the
+        candidate fits the role, their main strengths and the most important gaps.
+
+        JOB DESCRIPTION:
+        {job_description}
+        """
+
+
+def format_analysis(result: Dict[str, Any], narrative: str = "") -> str:
+    """Render a score in the SCORE/MATCHED/MISSING/ANALYSIS layout the UI expects"""
+    matched = result["matched_keywords"] + [
+        f"{term} (~{match})" for term, match in result["semantic_matches"].items()
+    ]
+    return (
+        f"SCORE: {result['score']}\n"
+        f"MATCHED KEYWORDS: {', '.join(matched)}\n"
+        f"MISSING KEYWORDS: {', '.join(result['missing_keywords'])}\n"
+        f"ANALYSIS: {narrative.strip()}"
+    )
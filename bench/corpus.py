@@ -0,0 +1,188 @@
+"""Synthetic resume corpus with known skills, for benchmarks that need labelled data."""
+import os
+import random
+import zipfile
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+SKILLS = [
+    "Python", "Java", "Go", "Rust", "C++", "C#", "TypeScript", "JavaScript", "Scala", "Kotlin",
+    "SQL", "PostgreSQL", "MySQL", "MongoDB", "Redis", "Cassandra", "Elasticsearch", "Snowflake",
+    "Kafka", "RabbitMQ", "Spark", "PySpark", "Airflow", "dbt", "Hadoop", "Flink",
+    "Docker", "Kubernetes", "Terraform", "Ansible", "Jenkins", "GitHub Actions", "Helm",
+    "AWS", "GCP", "Azure", "Lambda", "S3", "BigQuery",
+    "React", "Angular", "Vue", "Node.js", "Django", "Flask", "FastAPI", "Spring Boot",
+    "TensorFlow", "PyTorch", "scikit-learn", "Pandas", "NumPy", "LLMs", "NLP", "Computer Vision",
+    "GraphQL", "gRPC", "REST APIs", "Microservices", "Linux", "Prometheus", "Grafana",
+]
+TITLES = [
+    "Software Engineer", "Backend Engineer", "Data Engineer", "Machine Learning Engineer",
+    "DevOps Engineer", "Frontend Developer", "Full Stack Developer", "Site Reliability Engineer",
+    "Data Scientist", "Platform Engineer",
+]
+EMPLOYERS = [
+    "Acme Corp", "Globex", "Initech", "Umbrella Analytics", "Hooli", "Stark Industries",
+    "Wayne Enterprises", "Cyberdyne Systems", "Soylent Labs", "Vandelay Industries",
+]
+DEGREES = [
+    "B.Sc. Computer Science", "M.Sc. Computer Science", "B.Eng. Software Engineering",
+    "M.Sc. Data Science", "B.Sc. Mathematics", "Ph.D. Machine Learning",
+]
+VERBS = ["Built", "Designed", "Maintained", "Migrated", "Optimized", "Led development of", "Scaled"]
+OBJECTS = [
+    "a high-throughput event pipeline", "internal developer tooling", "the customer billing platform",
+    "a recommendation service", "real-time analytics dashboards", "the core REST API",
+    "a distributed job scheduler", "the data warehouse ingestion layer",
+]
+
+
+def generate_resume(rng: random.Random, index: int, words: int = 400) -> Dict[str, object]:
+    """One synthetic resume with Summary/Experience/Skills/Education sections"""
+    skills = rng.sample(SKILLS, rng.randint(5, 10))
+    title = rng.choice(TITLES)
+    lines = [
+        f"Candidate {index:05d}",
+        title,
+        "",
+        "SUMMARY",
+        f"{title} with {rng.randint(1, 15)} years of experience delivering production systems "
+        f"with {', '.join(skills[:3])}.",
+        "",
+        "EXPERIENCE",
+    ]
+    year = 2024
+    while len(" ".join(lines).split()) < words - 40:
+        start = year - rng.randint(1, 4)
+        lines.append(f"{rng.choice(TITLES)} - {rng.choice(EMPLOYERS)} ({start} - {year})")
+        for _ in range(rng.randint(2, 4)):
+            used = rng.sample(skills, min(2, len(skills)))
+            lines.append(f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} using {' and '.join(used)}.")
+        lines.append("")
+        year = start
+    lines += [
+        "SKILLS",
+        ", ".join(skills),
+        "",
+        "EDUCATION",
+        f"{rng.choice(DEGREES)} ({year - rng.randint(1, 5)})",
+    ]
+    return {"name": f"candidate_{index:05d}.txt", "text": "\n".join(lines), "skills": skills}
+
+
+def generate_corpus(count: int, words: int = 400, seed: int = 0) -> List[Dict[str, object]]:
+    rng = random.Random(seed)
+    return [generate_resume(rng, i, words) for i in range(count)]
+
+
+def generate_skill_queries(corpus: List[Dict[str, object]], count: int = 20,
+                           seed: int = 0) -> List[Dict[str, object]]:
+    """Recruiter-style queries, each labelled with the resumes that list the skill"""
+    rng = random.Random(seed)
+    present = sorted({skill for resume in corpus for skill in resume["skills"]})
+    queries = []
+    for skill in rng.sample(present, min(count, len(present))):
+        queries.append({
+            "query": f"candidate with hands-on {skill} experience",
+            "relevant": [resume["name"] for resume in corpus if skill in resume["skills"]]
+        })
+    return queries
+
+
+def write_txt(text: str, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def wrap_lines(text: str, width: int = 95) -> List[str]:
+    lines = []
+    for line in text.splitlines():
+        while len(line) > width:
+            cut = line.rfind(" ", 0, width)
+            cut = cut if cut > 0 else width
+            lines.append(line[:cut])
+            line = line[cut:].lstrip()
+        lines.append(line)
+    return lines
+
+
+def write_pdf(text: str, path: str, lines_per_page: int = 60) -> None:
+    """Plain single-font PDF whose text any PDF reader can extract"""
+    lines = wrap_lines(text)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    # Objects 1-3 are the catalog, page tree and font; each page adds a page and a content stream
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for page in pages:
+        commands = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        for line in page:
+            safe = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            commands.append(f"({safe}) Tj T*")
+        commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1", "replace")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        body = body if isinstance(body, bytes) else body.encode("latin-1")
+        out += f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_docx(text: str, path: str) -> None:
+    """Minimal Word document with one paragraph per line"""
+    paragraphs = "".join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in text.splitlines()
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType='
+            '"application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        docx.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+            'relationships/officeDocument" Target="word/document.xml"/>'
+            '</Relationships>'
+        ))
+        docx.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{paragraphs}</w:body></w:document>'
+        ))
+
+
+WRITERS = {"txt": write_txt, "pdf": write_pdf, "docx": write_docx}
+
+
+def write_corpus(corpus: List[Dict[str, object]], directory: str,
+                 formats: List[str]) -> List[Tuple[str, str]]:
+    """Write each resume to disk, cycling through formats; returns (path, file name) pairs"""
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for i, resume in enumerate(corpus):
+        fmt = formats[i % len(formats)]
+        name = os.path.splitext(resume["name"])[0] + "." + fmt
+        path = os.path.join(directory, name)
+        WRITERS[fmt](resume["text"], path)
+        files.append((path, name))
+    return files
@@ -0,0 +1,155 @@
+"""Compare embedding backends on throughput and resume retrieval quality.
+
+Example:
+    python -m bench.embedding_backends --variants langchain,int8,onnx \
+        --models sentence-transformers/all-mpnet-base-v2,sentence-transformers/all-MiniLM-L6-v2
+
+Each (backend, model) variant embeds the same chunked corpus and answers the
+same skill queries. Quality is scored against the labelled synthetic corpus
+(or a --queries file for a real --corpus-dir) as MRR and R-precision, with
+resumes ranked by their best-matching chunk.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import SimpleDirectoryReader # type: ignore
+from llama_index.core.node_parser import SentenceSplitter # type: ignore
+from llama_index.core.schema import Document # type: ignore
+
+from bench.corpus import generate_corpus, generate_skill_queries
+from embeddings import DEFAULT_EMBEDDING_MODEL, get_embedding_config, load_embedding_model
+
+
+def load_corpus(args) -> Tuple[List[Document], List[Dict[str, Any]]]:
+    if args.corpus_dir:
+        documents = SimpleDirectoryReader(args.corpus_dir).load_data()
+        queries = []
+        if args.queries:
+            with open(args.queries, encoding="utf-8") as f:
+                queries = json.load(f)
+        return documents, queries
+
+    corpus = generate_corpus(args.resumes, words=args.words, seed=args.seed)
+    documents = [Document(text=resume["text"], metadata={"file_name": resume["name"]}) for resume in corpus]
+    return documents, generate_skill_queries(corpus, count=args.query_count, seed=args.seed)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def retrieval_quality(chunk_vectors, chunk_files, query_vectors, queries) -> Dict[str, float]:
+    """MRR and R-precision, ranking each file by its best chunk"""
+    files = sorted(set(chunk_files))
+    file_index = np.array([files.index(name) for name in chunk_files])
+    similarity = normalize(query_vectors) @ normalize(chunk_vectors).T
+
+    reciprocal_ranks, r_precisions = [], []
+    for row, query in enumerate(queries):
+        relevant = set(query["relevant"])
+        if not relevant:
+            continue
+        best = np.full(len(files), -np.inf)
+        np.maximum.at(best, file_index, similarity[row])
+        ranking = [files[i] for i in np.argsort(-best)]
+        first_hit = next((rank for rank, name in enumerate(ranking, start=1) if name in relevant), None)
+        reciprocal_ranks.append(1.0 / first_hit if first_hit else 0.0)
+        r_precisions.append(len(relevant.intersection(ranking[:len(relevant)])) / len(relevant))
+
+    if not reciprocal_ranks:
+        return {}
+    return {"mrr": float(np.mean(reciprocal_ranks)), "r_precision": float(np.mean(r_precisions))}
+
+
+def run_variant(backend: str, model_name: str, texts, chunk_files, queries, args) -> Dict[str, Any]:
+    config = get_embedding_config()
+    config.update({"backend": backend, "model_name": model_name, "batch_size": args.batch_size})
+    if args.threads:
+        config["threads"] = args.threads
+    if args.max_seq_length:
+        config["max_seq_length"] = args.max_seq_length
+    if backend == "onnx" and args.onnx_file:
+        config["onnx_file"] = args.onnx_file
+
+    start = time.perf_counter()
+    embed_model = load_embedding_model(config)
+    load_seconds = time.perf_counter() - start
+
+    # One untimed batch so lazy initialisation doesn't count against throughput
+    embed_model.get_text_embedding_batch(texts[:config["batch_size"]])
+
+    start = time.perf_counter()
+    chunk_vectors = np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    result = {
+        "backend": backend,
+        "model": model_name,
+        "batch_size": config["batch_size"],
+        "threads": config["threads"],
+        "max_seq_length": config["max_seq_length"],
+        "load_seconds": round(load_seconds, 3),
+        "chunks": len(texts),
+        "embed_seconds": round(embed_seconds, 3),
+        "chunks_per_second": round(len(texts) / embed_seconds, 2) if embed_seconds else None,
+        "dimensions": int(chunk_vectors.shape[1]) if len(texts) else 0
+    }
+    if queries:
+        query_vectors = np.asarray(
+            [embed_model.get_query_embedding(query["query"]) for query in queries], dtype=np.float32
+        )
+        result.update(retrieval_quality(chunk_vectors, chunk_files, query_vectors, queries))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends on a resume corpus")
+    parser.add_argument("--variants", default="langchain,sentence-transformers,int8,onnx",
+                        help="Comma-separated EMBEDDING_BACKEND values to compare")
+    parser.add_argument("--models", default=DEFAULT_EMBEDDING_MODEL,
+                        help="Comma-separated embedding model names to compare")
+    parser.add_argument("--corpus-dir", help="Directory of real resumes instead of the synthetic corpus")
+    parser.add_argument("--queries", help="JSON list of {query, relevant: [file_name]} for --corpus-dir")
+    parser.add_argument("--resumes", type=int, default=200, help="Synthetic resumes to generate")
+    parser.add_argument("--words", type=int, default=400, help="Approximate words per synthetic resume")
+    parser.add_argument("--query-count", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--max-seq-length", type=int)
+    parser.add_argument("--onnx-file", help="ONNX export to load for the onnx backend")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    documents, queries = load_corpus(args)
+    nodes = SentenceSplitter(chunk_size=args.chunk_size).get_nodes_from_documents(documents)
+    texts = [node.get_content() for node in nodes]
+    chunk_files = [node.metadata.get("file_name", node.ref_doc_id) for node in nodes]
+
+    results = []
+    for model_name in args.models.split(","):
+        for backend in args.variants.split(","):
+            print(f"Benchmarking {backend} / {model_name} ...", file=sys.stderr)
+            try:
+                results.append(run_variant(backend, model_name, texts, chunk_files, queries, args))
+            except Exception as e:
+                results.append({"backend": backend, "model": model_name, "error": str(e)})
+
+    report = {"documents": len(documents), "chunks": len(texts), "queries": len(queries), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Benchmark ingest, single-file chat, ATS scoring and the /chat endpoint.
+
+Example:
+    python -m bench.end_to_end --resumes 50 --formats pdf,docx,txt --output bench.json
+
+Synthetic resumes are written as PDF, DOCX and TXT and pushed through:
+  ingest     process_multiple_files on batches of --batch-size files
+  chat       chat_with_llama with one uploaded file and a question
+  ats        client.get_ats_score against a server started in this process
+  http_chat  concurrent follow-up questions to POST /chat on a loaded session
+
+The LLM defaults to the local stub (LLM_PROVIDER=stub), the embedding cache,
+ingest artifacts, search index and profile store to an empty temporary
+directory and the answer cache to off, so the numbers measure this code rather
+than the network or earlier runs. Each scenario reports throughput,
+p50/p95/p99 latency and the process's peak RSS once it finished.
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.corpus import generate_corpus, generate_skill_queries, write_corpus
+
+JOB_DESCRIPTION = """
+Backend Engineer. We are looking for an engineer with strong Python and SQL skills,
+experience building REST APIs and microservices with FastAPI or Django, and running
+them on AWS with Docker and Kubernetes. Kafka, Redis and PostgreSQL are a plus.
+"""
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain"
+}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies: List[float], wall_seconds: float, errors: int = 0, items: int = None) -> Dict[str, Any]:
+    """Throughput and latency percentiles for one scenario"""
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+    if items is not None:
+        result["items_per_second"] = round(items / wall_seconds, 3) if wall_seconds else None
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        result.update({
+            "mean_seconds": round(float(np.mean(latencies)), 4),
+            "p50_seconds": round(float(p50), 4),
+            "p95_seconds": round(float(p95), 4),
+            "p99_seconds": round(float(p99), 4)
+        })
+    return result
+
+
+def timed_calls(calls: List[Callable[[], Any]], concurrency: int = 1) -> Tuple[List[float], int, float]:
+    """Run calls with a thread pool, returning (latencies, error count, wall seconds)"""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def run(call):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            print(f"Benchmark call failed: {e}", file=sys.stderr)
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, calls))
+    return latencies, errors, time.perf_counter() - start
+
+
+def bench_ingest(api, files, args) -> Dict[str, Any]:
+    batches = [files[i:i + args.batch_size] for i in range(0, len(files), args.batch_size)]
+
+    def ingest(index, batch):
+        def call():
+            session = api.sessions.get(f"bench-ingest-{index}")
+            try:
+                api.process_multiple_files(batch, session)
+                missing = len(batch) - len(session.doc_store["documents"])
+                if missing:
+                    raise RuntimeError(f"{missing} of {len(batch)} files failed to ingest")
+            finally:
+                session.reset()
+                api.sessions.drop(session.session_id)
+        return call
+
+    latencies, errors, wall = timed_calls([ingest(i, batch) for i, batch in enumerate(batches)])
+    return summarize(latencies, wall, errors, items=len(files))
+
+
+def bench_chat(api, files, questions, args) -> Dict[str, Any]:
+    def chat(index, file, question):
+        def call():
+            session_id = f"bench-chat-{index}"
+            try:
+                api.chat_with_llama([], question, file_paths=[file], session_id=session_id)
+            finally:
+                api.sessions.get(session_id).reset()
+                api.sessions.drop(session_id)
+        return call
+
+    calls = [chat(i, file, questions[i % len(questions)]) for i, file in enumerate(files[:args.requests])]
+    latencies, errors, wall = timed_calls(calls)
+    return summarize(latencies, wall, errors)
+
+
+def bench_ats(api_url, files, args) -> Dict[str, Any]:
+    from client import get_ats_score
+
+    def score(path, name):
+        def call():
+            with open(path, "rb") as f:
+                resume = {"name": name, "content": f.read(),
+                          "type": CONTENT_TYPES[name.rsplit(".", 1)[-1]]}
+            result = get_ats_score(JOB_DESCRIPTION, resume, api_url)
+            if str(result.get("full_analysis", "")).startswith("Error"):
+                raise RuntimeError(result["full_analysis"])
+        return call
+
+    calls = [score(path, name) for path, name in files[:args.requests]]
+    latencies, errors, wall = timed_calls(calls, concurrency=args.concurrency)
+    return summarize(latencies, wall, errors)
+
+
+def bench_http_chat(api_url, files, questions, args) -> Dict[str, Any]:
+    import requests
+
+    session_id = "bench-http"
+    uploads = []
+    for i, (path, name) in enumerate(files[:args.batch_size]):
+        with open(path, "rb") as f:
+            uploads.append((f"file_{i}", (name, f.read(), CONTENT_TYPES[name.rsplit(".", 1)[-1]])))
+    requests.post(f"{api_url}/documents", params={"session_id": session_id}, files=uploads).raise_for_status()
+
+    def ask(question):
+        def call():
+            data = {"chat_history": [], "message": question, "session_id": session_id}
+            requests.post(f"{api_url}/chat", data={"data": json.dumps(data)}).raise_for_status()
+        return call
+
+    try:
+        calls = [ask(f"{questions[i % len(questions)]} (question {i})") for i in range(args.requests)]
+        latencies, errors, wall = timed_calls(calls, concurrency=args.concurrency)
+    finally:
+        requests.post(f"{api_url}/new_chat", params={"session_id": session_id})
+    return summarize(latencies, wall, errors)
+
+
+def start_server(app) -> Tuple[str, Any]:
+    """Serve the app with uvicorn on a free local port in a background thread"""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the resume ingest, chat and ATS paths")
+    parser.add_argument("--scenarios", default="ingest,chat,ats,http_chat",
+                        help="Comma-separated scenarios to run")
+    parser.add_argument("--resumes", type=int, default=30, help="Synthetic resumes to generate")
+    parser.add_argument("--words", type=int, default=600, help="Approximate words per resume")
+    parser.add_argument("--formats", default="pdf,docx,txt", help="Comma-separated file formats to cycle through")
+    parser.add_argument("--batch-size", type=int, default=10, help="Files per ingest batch and HTTP chat session")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per chat, ATS and HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients for ats and http_chat")
+    parser.add_argument("--llm-provider", default="stub", help="LLM_PROVIDER to benchmark with")
+    parser.add_argument("--embedding-cache-dir", help="Reuse an embedding cache instead of starting cold")
+    parser.add_argument("--corpus-dir", help="Where to write the generated resumes (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="resume-bench-")
+    # Settings are read when api is imported, so the environment has to be in place first
+    os.environ["LLM_PROVIDER"] = args.llm_provider
+    os.environ["EMBEDDING_CACHE_DIR"] = args.embedding_cache_dir or os.path.join(workdir, "embedding_cache")
+    os.environ["INGEST_ARTIFACT_DIR"] = os.path.join(workdir, "ingest_artifacts")
+    os.environ["SEARCH_INDEX_DIR"] = os.path.join(workdir, "search_index")
+    os.environ["PROFILE_STORE_DIR"] = os.path.join(workdir, "profile_store")
+    os.environ["ANSWER_CACHE_SIZE"] = "0"
+    os.environ["INDEX_STORAGE_DIR"] = ""
+
+    corpus = generate_corpus(args.resumes, words=args.words, seed=args.seed)
+    files = write_corpus(corpus, args.corpus_dir or os.path.join(workdir, "resumes"), args.formats.split(","))
+    questions = [query["query"] for query in generate_skill_queries(corpus, count=20, seed=args.seed)]
+    questions = [f"Does the candidate have {q.replace('candidate with ', '')}?" for q in questions]
+
+    start = time.perf_counter()
+    import api
+    import_seconds = time.perf_counter() - start
+
+    scenarios = args.scenarios.split(",")
+    results = {}
+    api_url, server = None, None
+    if {"ats", "http_chat"} & set(scenarios):
+        api_url, server = start_server(api.app)
+
+    for scenario in scenarios:
+        print(f"Running {scenario} ...", file=sys.stderr)
+        if scenario == "ingest":
+            results[scenario] = bench_ingest(api, files, args)
+        elif scenario == "chat":
+            results[scenario] = bench_chat(api, files, questions, args)
+        elif scenario == "ats":
+            results[scenario] = bench_ats(api_url, files, args)
+        elif scenario == "http_chat":
+            results[scenario] = bench_http_chat(api_url, files, questions, args)
+        else:
+            results[scenario] = {"error": f"Unknown scenario {scenario}"}
+
+    if server is not None:
+        server.should_exit = True
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "import_seconds": round(import_seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.node_parser import NodeParser, SentenceSplitter # type: ignore
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits # type: ignore
+from llama_index.core.schema import BaseNode, MetadataMode # type: ignore
+
+from profiles import EDUCATION_HEADINGS, OTHER_HEADINGS
+
+CHUNKING_STRATEGIES = ("resume", "sentence")
+
+# Name of the text before a resume's first heading: usually the name, contact details and a summary
+OPENING_SECTION = "Overview"
+# A heading line is nothing but known headings ("Education & Certifications"), optionally
+# qualified ("Work Experience", "Technical Skills"); "Strong Python experience" is content
+HEADING = "|".join(re.escape(heading) for heading in EDUCATION_HEADINGS + OTHER_HEADINGS)
+HEADING_LINE = re.compile(
+    rf"(?:(?:work|professional|technical|relevant|key|core|academic)\s+)?(?:{HEADING})"
+    rf"(?:\s*(?:&|/|,|and)\s*(?:{HEADING}))*",
+    re.IGNORECASE
+)
+# A section shorter than this (little more than its heading) is folded into the next one
+MIN_SECTION_TOKENS = 8
+
+
+def get_chunking_config() -> Dict[str, Any]:
+    """Chunking settings from the environment.
+
+    CHUNKING_STRATEGY is one of:
+      resume    split at resume section headings (Experience, Skills, ...), then by sentence
+      sentence  LlamaIndex's SentenceSplitter over the whole document
+    """
+    strategy = os.getenv("CHUNKING_STRATEGY", "resume")
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown CHUNKING_STRATEGY {strategy!r}, expected one of {', '.join(CHUNKING_STRATEGIES)}")
+    return {
+        "strategy": strategy,
+        "chunk_size": int(os.getenv("CHUNK_SIZE", "256")),
+        "chunk_overlap": int(os.getenv("CHUNK_OVERLAP", "32"))
+    }
+
+
+def get_chunking_key(config: Dict[str, Any]) -> str:
+    """Names the chunking a stored artifact was built with, so a config change re-chunks"""
+    return f"{config['strategy']}:{config['chunk_size']}:{config['chunk_overlap']}"
+
+
+def load_node_parser(config: Dict[str, Any]) -> NodeParser:
+    parser_class = ResumeSectionSplitter if config["strategy"] == "resume" else SentenceSplitter
+    return parser_class(chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"])
+
+
+def section_heading(line: str) -> Optional[str]:
+    """The section name if the line is a resume heading such as "WORK EXPERIENCE:", else None"""
+    text = line.strip().strip(":").strip()
+    if not HEADING_LINE.fullmatch(text):
+        return None
+    return text.title() if text.isupper() else text
+
+
+def split_sections(text: str, opening: str = OPENING_SECTION) -> List[Tuple[str, str]]:
+    """(section name, text) pairs in document order; each text starts with its heading line"""
+    sections: List[Tuple[str, List[str]]] = [(opening, [])]
+    for line in text.splitlines():
+        heading = section_heading(line)
+        if heading is not None:
+            sections.append((heading, []))
+        sections[-1][1].append(line)
+    return [(name, "\n".join(lines).strip()) for name, lines in sections if "\n".join(lines).strip()]
+
+
+class ResumeSectionSplitter(SentenceSplitter):
+    """Chunks resumes along their sections before splitting by sentence.
+
+    Every chunk stays within one section (Experience, Education, Skills,
+    Projects, ...) and carries its name in a "section" metadata field, which
+    is embedded with the text, so a question about education retrieves the
+    education chunk rather than half of the work history with it. Sections
+    longer than chunk_size are split by sentence with chunk_overlap; tiny
+    ones are folded into a neighbour. A section that carries on onto the
+    next page keeps its name.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ResumeSectionSplitter"
+
+    def merge_small_sections(self, sections: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        merged: List[Tuple[str, str]] = []
+        pending: Optional[Tuple[str, str]] = None
+        for name, text in sections:
+            if pending is not None:
+                name, text = f"{pending[0]}, {name}", f"{pending[1]}\n{text}"
+                pending = None
+            if len(self._tokenizer(text)) < MIN_SECTION_TOKENS:
+                pending = (name, text)
+            else:
+                merged.append((name, text))
+        if pending is not None:
+            if merged:
+                name, text = merged.pop()
+                pending = (f"{name}, {pending[0]}", f"{text}\n{pending[1]}")
+            merged.append(pending)
+        return merged
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False,
+                     **kwargs: Any) -> List[BaseNode]:
+        all_nodes: List[BaseNode] = []
+        # PDFs come in one document per page; the last section of a page continues on the next
+        last_section: Dict[Optional[str], str] = {}
+        for node in nodes:
+            file_name = node.metadata.get("file_name")
+            sections = split_sections(node.get_content(metadata_mode=MetadataMode.NONE),
+                                      opening=last_section.get(file_name, OPENING_SECTION))
+            if not sections:
+                continue
+            last_section[file_name] = sections[-1][0]
+            metadata_str = self._get_metadata_str(node)
+            for name, text in self.merge_small_sections(sections):
+                splits = self.split_text_metadata_aware(text, metadata_str=f"{metadata_str}\nsection: {name}")
+                section_nodes = build_nodes_from_splits(splits, node, id_func=self.id_func)
+                for section_node in section_nodes:
+                    section_node.metadata["section"] = name
+                all_nodes.extend(section_nodes)
+        return all_nodes
@@ -0,0 +1,147 @@
+"""Lightweight HTTP client for the resume analysis API.
+
+Imports nothing heavier than requests, so the Streamlit frontend can use it
+without loading LlamaIndex, torch or the embedding model.
+"""
+import json
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+import requests
+
+def create_ats_prompt(job_description):
+    """Create a structured prompt for deterministic scoring"""
+    return f"""
+        Please analyze this resume against the job description. 
+        
+        Extract all relevant keywords from the job description and check if they exist in the resume.
+        Use the following scoring method:
+        1. Calculate exact keyword matches (weighted at 70%)
+        2. Calculate semantic/synonym matches (weighted at 30%)
+        3. Provide a final percentage score
+        
+        Format your response exactly as follows:
+        SCORE: [0-100]
+        MATCHED KEYWORDS: [comma-separated list]
+        MISSING KEYWORDS: [comma-separated list]
+        ANALYSIS: [brief explanation]
+        
+        JOB DESCRIPTION:
+        {job_description}
+        """
+
+def parse_ats_response(response_text):
+    """Pull the SCORE: line out of an ATS analysis"""
+    score_match = re.search(r'SCORE:\s*(\d+)', response_text)
+    return {
+        "score": int(score_match.group(1)) if score_match else None,
+        "full_analysis": response_text
+    }
+
+def get_ats_score(job_description, resume_data, api_url):
+    """Get ATS score for a resume compared to a job description"""
+    # Score in a throwaway session so the caller's chat session is left untouched
+    session_id = f"ats-{uuid.uuid4().hex}"
+    try:
+        # Create data for API request
+        data = {
+            "message": create_ats_prompt(job_description),
+            "chat_history": [],  # Empty to ensure consistency
+            "session_id": session_id
+        }
+        
+        # Package the resume for sending
+        files = {
+            "file": (
+                resume_data["name"], 
+                resume_data["content"], 
+                resume_data["type"]
+            )
+        }
+        
+        # Send to API
+        response = requests.post(
+            f"{api_url}/chat",
+            data={"data": json.dumps(data)},
+            files=files
+        )
+        
+        response.raise_for_status()
+        result = response.json()
+        
+        # Parse the score from the response
+        return parse_ats_response(str(result["response"]))
+        
+    except Exception as e:
+        print(f"Error getting ATS score: {str(e)}")
+        return {"score": None, "full_analysis": f"Error: {str(e)}"}
+    finally:
+        try:
+            requests.post(f"{api_url}/new_chat", params={"session_id": session_id})
+        except requests.exceptions.RequestException:
+            pass
+
+# Job IDs the backend has issued for recent job descriptions, so each one is sent once.
+# Bounded like the server's own job cache, which may forget an ID first; a 404 re-registers.
+REGISTERED_JOBS_SIZE = 128
+registered_jobs = OrderedDict()
+registered_jobs_lock = threading.Lock()
+
+def get_registered_job(job_description):
+    with registered_jobs_lock:
+        job_id = registered_jobs.get(job_description)
+        if job_id is not None:
+            registered_jobs.move_to_end(job_description)
+        return job_id
+
+def register_job_description(job_description, api_url):
+    """Register a job description with the backend and return its job ID"""
+    response = requests.post(f"{api_url}/ats/jobs", json={"job_description": job_description})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    with registered_jobs_lock:
+        registered_jobs[job_description] = job_id
+        registered_jobs.move_to_end(job_description)
+        while len(registered_jobs) > REGISTERED_JOBS_SIZE:
+            registered_jobs.popitem(last=False)
+    return job_id
+
+def get_ats_scores_batch(job_description, resumes, api_url, max_workers=None, analysis=True):
+    """Score many resumes through /ats/batch, yielding (name, score_data) as each finishes"""
+    job_id = get_registered_job(job_description) or register_job_description(job_description, api_url)
+    data = {"job_id": job_id, "analysis": analysis}
+    if max_workers:
+        data["max_workers"] = max_workers
+    files = {
+        f"file_{i}": (resume_data["name"], resume_data["content"], resume_data["type"])
+        for i, resume_data in enumerate(resumes)
+    }
+
+    response = requests.post(
+        f"{api_url}/ats/batch",
+        data={"data": json.dumps(data)},
+        files=files,
+        stream=True
+    )
+    if response.status_code == 404:
+        # The backend restarted or evicted the job; register it again and retry once
+        response.close()
+        data["job_id"] = register_job_description(job_description, api_url)
+        response = requests.post(
+            f"{api_url}/ats/batch",
+            data={"data": json.dumps(data)},
+            files=files,
+            stream=True
+        )
+
+    with response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:") and event == "result":
+                result = json.loads(line[len("data:"):].strip())
+                yield result.pop("name"), result
@@ -0,0 +1,172 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from llama_index.core import PromptTemplate, Settings, VectorStoreIndex # type: ignore
+from llama_index.core.base.response.schema import Response, StreamingResponse # type: ignore
+from llama_index.core.query_engine import CustomQueryEngine # type: ignore
+from llama_index.core.schema import NodeWithScore, QueryBundle, QueryType # type: ignore
+from llama_index.core.vector_stores import ExactMatchFilter, MetadataFilters # type: ignore
+
+from hybrid import BM25Index, HybridRetriever, get_hybrid_alpha
+from prompts import available_tokens, count_tokens, truncate_to_tokens
+
+COMPARISON_PROMPT = PromptTemplate(
+    "Below are excerpts from {file_count} resumes, grouped by file name.\n"
+    "---------------------\n"
+    "{context_str}\n"
+    "---------------------\n"
+    "Using only these excerpts, answer the question. Keep track of which details come from which resume.\n"
+    "Question: {query_str}\n"
+    "Answer: "
+)
+
+FILE_SUMMARY_PROMPT = PromptTemplate(
+    "Below are excerpts from the resume {file_name}.\n"
+    "---------------------\n"
+    "{context_str}\n"
+    "---------------------\n"
+    "Summarize everything in these excerpts that is relevant to the question below, "
+    "in at most {max_words} words. Do not answer for any other candidate.\n"
+    "Question: {query_str}\n"
+    "Summary: "
+)
+
+def get_comparison_mode() -> str:
+    """COMPARISON_MODE is "retrieval" (the default) or "tree_summarize" for the old behaviour"""
+    return os.getenv("COMPARISON_MODE", "retrieval")
+
+
+def as_query_bundle(str_or_query_bundle: QueryType) -> QueryBundle:
+    if isinstance(str_or_query_bundle, QueryBundle):
+        return str_or_query_bundle
+    return QueryBundle(str_or_query_bundle)
+
+
+def format_file_context(file_name: str, nodes: List[NodeWithScore]) -> str:
+    excerpts = "\n\n".join(node.node.get_content() for node in nodes)
+    return f"=== RESUME: {file_name} ===\n{excerpts}"
+
+
+class ComparisonQueryEngine(CustomQueryEngine):
+    """Answers questions across several resumes with a bounded number of LLM calls.
+
+    The question is embedded once and the top chunks_per_file chunks of every
+    file are retrieved from the combined index with a file_name metadata filter,
+    so each candidate gets the same share of the context however many chunks
+    the others have. With a sparse index each file's chunks come from hybrid
+    BM25 and vector retrieval instead. When all of them fit in the LLM's context window the
+    answer takes a single call. Otherwise each file is summarized against the
+    question and the summaries are combined, for at most len(file_names) + 1
+    calls.
+    """
+
+    index: VectorStoreIndex
+    file_names: List[str]
+    chunks_per_file: int = 2
+    sparse_index: Optional[BM25Index] = None
+    streaming: bool = False
+
+    def query(self, str_or_query_bundle: QueryType):
+        # Keep the bundle intact so a separate retrieval string survives
+        with self.callback_manager.as_trace("query"):
+            return self.run(as_query_bundle(str_or_query_bundle))
+
+    async def aquery(self, str_or_query_bundle: QueryType):
+        with self.callback_manager.as_trace("query"):
+            return await self.arun(as_query_bundle(str_or_query_bundle))
+
+    def custom_query(self, query_str: str):
+        return self.run(QueryBundle(query_str))
+
+    async def acustom_query(self, query_str: str):
+        return await self.arun(QueryBundle(query_str))
+
+    def retrieve(self, query_bundle: QueryBundle) -> Dict[str, List[NodeWithScore]]:
+        # Embed the question once and reuse it for every file's retriever
+        query_bundle = QueryBundle(
+            query_bundle.query_str, custom_embedding_strs=query_bundle.embedding_strs,
+            embedding=Settings.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        )
+        return {name: self.get_retriever(name).retrieve(query_bundle) for name in self.file_names}
+
+    async def aretrieve(self, query_bundle: QueryBundle) -> Dict[str, List[NodeWithScore]]:
+        query_bundle = QueryBundle(
+            query_bundle.query_str, custom_embedding_strs=query_bundle.embedding_strs,
+            embedding=await Settings.embed_model.aget_agg_embedding_from_queries(query_bundle.embedding_strs)
+        )
+        return {name: await self.get_retriever(name).aretrieve(query_bundle) for name in self.file_names}
+
+    def get_retriever(self, file_name: str):
+        if self.sparse_index is not None:
+            return HybridRetriever(self.index, self.sparse_index, top_k=self.chunks_per_file,
+                                   alpha=get_hybrid_alpha(), file_name=file_name)
+        return self.index.as_retriever(
+            similarity_top_k=self.chunks_per_file,
+            filters=MetadataFilters(filters=[ExactMatchFilter(key="file_name", value=file_name)])
+        )
+
+    def context_budget(self, query_str: str) -> int:
+        """Tokens left for resume excerpts once the question and the answer are accounted for"""
+        return available_tokens() - count_tokens(query_str) - count_tokens(COMPARISON_PROMPT.template)
+
+    def plan(self, query_str: str, retrieved: Dict[str, List[NodeWithScore]]) -> Optional[str]:
+        """Packed context for a single call, or None if it would overflow the budget"""
+        context_str = "\n\n".join(format_file_context(name, nodes) for name, nodes in retrieved.items())
+        if count_tokens(context_str) > self.context_budget(query_str):
+            return None
+        return context_str
+
+    def summary_kwargs(self, query_str: str, file_name: str, nodes: List[NodeWithScore]) -> Dict[str, Any]:
+        budget = self.context_budget(query_str)
+        # Each summary gets an equal slice of the final call's context
+        max_words = max(50, int(budget / len(self.file_names) * 0.75))
+        return {
+            "file_name": file_name,
+            "context_str": truncate_to_tokens(format_file_context(file_name, nodes), budget),
+            "max_words": max_words,
+            "query_str": query_str
+        }
+
+    def combine(self, query_str: str, summaries: Dict[str, str]) -> str:
+        share = max(1, self.context_budget(query_str) // max(1, len(summaries)))
+        return "\n\n".join(
+            f"=== RESUME: {name} ===\n{truncate_to_tokens(summary, share)}" for name, summary in summaries.items()
+        )
+
+    def answer(self, query_str: str, context_str: str, sources: List[NodeWithScore]):
+        kwargs = {"file_count": len(self.file_names), "context_str": context_str, "query_str": query_str}
+        if self.streaming:
+            return StreamingResponse(response_gen=Settings.llm.stream(COMPARISON_PROMPT, **kwargs),
+                                     source_nodes=sources)
+        return Response(Settings.llm.predict(COMPARISON_PROMPT, **kwargs), source_nodes=sources)
+
+    def run(self, query_bundle: QueryBundle):
+        query_str = query_bundle.query_str
+        retrieved = self.retrieve(query_bundle)
+        sources = [node for nodes in retrieved.values() for node in nodes]
+        context_str = self.plan(query_str, retrieved)
+        if context_str is None:
+            print(f"Comparison context over budget, summarizing {len(retrieved)} resumes first")
+            summaries = {
+                name: Settings.llm.predict(FILE_SUMMARY_PROMPT, **self.summary_kwargs(query_str, name, nodes))
+                for name, nodes in retrieved.items()
+            }
+            context_str = self.combine(query_str, summaries)
+        return self.answer(query_str, context_str, sources)
+
+    async def arun(self, query_bundle: QueryBundle):
+        query_str = query_bundle.query_str
+        retrieved = await self.aretrieve(query_bundle)
+        sources = [node for nodes in retrieved.values() for node in nodes]
+        context_str = self.plan(query_str, retrieved)
+        if context_str is None:
+            print(f"Comparison context over budget, summarizing {len(retrieved)} resumes first")
+            summaries = {
+                name: await Settings.llm.apredict(FILE_SUMMARY_PROMPT, **self.summary_kwargs(query_str, name, nodes))
+                for name, nodes in retrieved.items()
+            }
+            context_str = self.combine(query_str, summaries)
+        if self.streaming:
+            return self.answer(query_str, context_str, sources)
+        kwargs = {"file_count": len(self.file_names), "context_str": context_str, "query_str": query_str}
+        return Response(await Settings.llm.apredict(COMPARISON_PROMPT, **kwargs), source_nodes=sources)
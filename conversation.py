@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from llama_index.core import PromptTemplate, Settings # type: ignore
+from llama_index.core.schema import QueryBundle # type: ignore
+
+import metrics
+from prompts import available_tokens, count_tokens, get_history_tokens
+
+CONDENSE_PROMPT = PromptTemplate(
+    "Given the conversation below and a follow-up message, rewrite the follow-up as a short "
+    "standalone question that can be understood without the conversation. Keep names of "
+    "candidates, files, skills and roles. Reply with the question only.\n"
+    "Conversation:\n"
+    "{history_str}\n"
+    "Follow-up message: {message}\n"
+    "Standalone question: "
+)
+
+# Turns shown to the condense prompt; older turns rarely change what a follow-up refers to
+CONDENSE_TURNS = 4
+
+
+def get_chat_mode() -> str:
+    """CHAT_MODE is "condense" (the default) or "transcript" to retrieve on the whole transcript"""
+    return os.getenv("CHAT_MODE", "condense")
+
+
+def format_turn(human: str, assistant: str) -> str:
+    return f"<|USER|>{human}\n<|ASSISTANT|>{assistant}"
+
+
+def format_history(chat_history: Sequence, max_tokens: Optional[int] = None) -> str:
+    """The most recent turns that fit in max_tokens, oldest first"""
+    if max_tokens is None:
+        max_tokens = int(os.getenv("CHAT_HISTORY_TOKENS", "1024"))
+    turns, used = [], 0
+    for item in reversed(chat_history):
+        turn = format_turn(item.human, item.assistant)
+        tokens = count_tokens(turn)
+        if used + tokens > max_tokens:
+            break
+        turns.append(turn)
+        used += tokens
+    return "\n".join(reversed(turns))
+
+
+class CondensedQuestionCache:
+    """LRU of standalone questions by conversation and follow-up, so retries and
+    the streaming and non-streaming paths don't condense the same turn twice"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._questions: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(history_str: str, message: str) -> str:
+        return hashlib.sha256(f"{history_str}\x00{message}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            question = self._questions.get(key)
+            if question is not None:
+                self._questions.move_to_end(key)
+            return question
+
+    def put(self, key: str, question: str) -> None:
+        with self._lock:
+            self._questions[key] = question
+            self._questions.move_to_end(key)
+            while len(self._questions) > self.max_entries:
+                self._questions.popitem(last=False)
+
+
+condensed_questions = CondensedQuestionCache(int(os.getenv("CHAT_CONDENSE_CACHE_SIZE", "1024")))
+
+
+def condense_question(chat_history: Sequence, message: str) -> str:
+    """Standalone retrieval question for a follow-up; the message itself when there is no history"""
+    if not chat_history:
+        return message
+    # The condense call gets the same window as the answer, so long turns are dropped oldest first
+    budget = available_tokens() - count_tokens(CONDENSE_PROMPT.template) - count_tokens(message)
+    history_str = format_history(chat_history[-CONDENSE_TURNS:], max(0, budget))
+    key = condensed_questions.key(history_str, message)
+    question = condensed_questions.get(key)
+    if question is None:
+        with metrics.timed("condense"):
+            question = Settings.llm.predict(CONDENSE_PROMPT, history_str=history_str, message=message).strip()
+        # A blank rewrite would retrieve nothing useful; fall back to the raw message
+        question = question or message
+        condensed_questions.put(key, question)
+    return question
+
+
+def build_query_bundle(chat_history: Sequence, message: str, prompt: Optional[str] = None) -> QueryBundle:
+    """Query whose LLM prompt carries a token-budgeted history and whose retrieval
+    embedding is only the standalone question.
+
+    prompt is the text put to the LLM for this turn, defaulting to the message.
+    The history gets what the prompt leaves of its share of the context window.
+    """
+    prompt = prompt or message
+    full_query = f"{format_history(chat_history, get_history_tokens(prompt))}\n<|USER|>{prompt}<|ASSISTANT|>"
+    if get_chat_mode() != "condense":
+        return QueryBundle(full_query)
+    return QueryBundle(full_query, custom_embedding_strs=[condense_question(chat_history, message)])
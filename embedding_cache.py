@@ -0,0 +1,210 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding  # type: ignore
+from llama_index.core.bridge.pydantic import PrivateAttr  # type: ignore
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store backed by SQLite with LRU eviction.
+
+    Vectors are keyed by the SHA-256 of the embedding model name and the chunk
+    text, so the same chunk is only ever embedded once per model. A small
+    in-memory LRU sits in front of the database for hot entries.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str,
+                 max_entries: int = 100000, memory_entries: int = 5000):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "embeddings.sqlite3"),
+            check_same_thread=False
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def key(self, text: str, kind: str = "text") -> str:
+        """Cache key for a chunk of text embedded by this cache's model"""
+        payload = f"{self.model_name}\x00{kind}\x00{text}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the keys that are present"""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+            if missing:
+                now = time.time()
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f", blob).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors and evict the least recently used entries past the limit"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+            )
+            for key, vector in items.items():
+                self._remember(key, list(vector))
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": size, "hits": self.hits, "misses": self.misses}
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated chunks from an EmbeddingCache"""
+
+    _base: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, base: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any):
+        super().__init__(
+            model_name=cache.model_name,
+            embed_batch_size=base.embed_batch_size,
+            **kwargs
+        )
+        self._base = base
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    @property
+    def base(self) -> BaseEmbedding:
+        return self._base
+
+    def _partition(self, texts: List[str], kind: str):
+        keys = [self._cache.key(text, kind) for text in texts]
+        found = self._cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats in the batch
+        pending: "OrderedDict[str, str]" = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key not in found:
+                pending.setdefault(key, text)
+        return keys, found, pending
+
+    def _lookup(self, texts: List[str], kind: str, embed_fn) -> List[List[float]]:
+        keys, found, pending = self._partition(texts, kind)
+        if pending:
+            new_items = dict(zip(pending.keys(), embed_fn(list(pending.values()))))
+            self._cache.put_many(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    async def _alookup(self, texts: List[str], kind: str, aembed_fn) -> List[List[float]]:
+        keys, found, pending = self._partition(texts, kind)
+        if pending:
+            new_items = dict(zip(pending.keys(), await aembed_fn(list(pending.values()))))
+            self._cache.put_many(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._lookup(
+            [query], "query",
+            lambda texts: [self._base.get_query_embedding(texts[0])]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def aembed(texts):
+            return [await self._base.aget_query_embedding(texts[0])]
+        return (await self._alookup([query], "query", aembed))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._alookup(texts, "text", self._base.aget_text_embedding_batch)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._lookup(texts, "text", self._base.get_text_embedding_batch)
+
+
+def get_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    """Build the embedding cache from environment settings, or None if disabled"""
+    cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+    if not cache_dir:
+        return None
+    return EmbeddingCache(
+        cache_dir,
+        model_name,
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+        memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "5000"))
+    )
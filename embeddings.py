@@ -0,0 +1,209 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding  # type: ignore
+from llama_index.core.bridge.pydantic import PrivateAttr  # type: ignore
+
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+# Roughly 5x faster on CPU than mpnet, at some cost in retrieval quality
+SMALL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+EMBEDDING_BACKENDS = ("langchain", "sentence-transformers", "int8", "onnx")
+
+
+def get_embedding_config() -> Dict[str, Any]:
+    """Embedding backend settings from the environment.
+
+    EMBEDDING_BACKEND is one of:
+      langchain              LangChain HuggingFaceEmbeddings wrapper (the original setup)
+      sentence-transformers  sentence-transformers directly, with explicit batching
+      int8                   the same model with its Linear layers dynamically quantized to int8
+      onnx                   ONNX Runtime; EMBEDDING_ONNX_FILE selects a quantized export,
+                             e.g. onnx/model_qint8_avx512_vnni.onnx
+    """
+    backend = os.getenv("EMBEDDING_BACKEND", "langchain")
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    max_seq_length = os.getenv("EMBEDDING_MAX_SEQ_LENGTH")
+    threads = os.getenv("EMBEDDING_THREADS")
+    return {
+        "backend": backend,
+        "model_name": os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+        "batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        "threads": int(threads) if threads else None,
+        "max_seq_length": int(max_seq_length) if max_seq_length else None,
+        "onnx_file": os.getenv("EMBEDDING_ONNX_FILE") or None
+    }
+
+
+def get_cache_model_name(config: Dict[str, Any]) -> str:
+    """Name the embedding cache keys on; backends that change the vectors get their own keys"""
+    name = config["model_name"]
+    if config["backend"] == "int8":
+        name += ":int8"
+    elif config["backend"] == "onnx":
+        name += f":onnx:{config['onnx_file'] or 'model.onnx'}"
+    if config["max_seq_length"]:
+        name += f":seq{config['max_seq_length']}"
+    return name
+
+
+def load_huggingface_embedding(model_name: str, max_seq_length: Optional[int] = None) -> BaseEmbedding:
+    """Load a sentence-transformers model through LangChain (pulls in torch)"""
+    from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+    from llama_index.embeddings.langchain import LangchainEmbedding # type: ignore
+
+    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    if max_seq_length:
+        # The wrapper has no setting for it, but its client is the SentenceTransformer itself
+        embeddings.client.max_seq_length = max_seq_length
+    return LangchainEmbedding(embeddings)
+
+
+def load_onnx_session_options(threads: Optional[int]) -> Any:
+    """ONNX Runtime session options; torch's thread setting doesn't reach onnxruntime"""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return options
+
+
+def load_embedding_model(config: Dict[str, Any]) -> BaseEmbedding:
+    """Load the embedding model for a backend config (pulls in torch or onnxruntime)"""
+    if config["threads"] and config["backend"] != "onnx":
+        import torch
+        torch.set_num_threads(config["threads"])
+
+    if config["backend"] == "langchain":
+        embed_model = load_huggingface_embedding(config["model_name"], config["max_seq_length"])
+        embed_model.embed_batch_size = config["batch_size"]
+        return embed_model
+
+    from sentence_transformers import SentenceTransformer
+
+    if config["backend"] == "onnx":
+        model_kwargs = {"session_options": load_onnx_session_options(config["threads"])}
+        if config["onnx_file"]:
+            model_kwargs["file_name"] = config["onnx_file"]
+        model = SentenceTransformer(config["model_name"], device="cpu", backend="onnx",
+                                    model_kwargs=model_kwargs)
+    else:
+        model = SentenceTransformer(config["model_name"], device="cpu")
+        if config["backend"] == "int8":
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if config["max_seq_length"]:
+        model.max_seq_length = config["max_seq_length"]
+    return SentenceTransformerEmbedding(model, model_name=config["model_name"],
+                                        embed_batch_size=config["batch_size"])
+
+
+class SentenceTransformerEmbedding(BaseEmbedding):
+    """sentence-transformers model called directly, one encode() per batch"""
+
+    _model: Any = PrivateAttr()
+
+    def __init__(self, model: Any, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._model = model
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SentenceTransformerEmbedding"
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(
+            texts, batch_size=self.embed_batch_size, convert_to_numpy=True, show_progress_bar=False
+        ).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._encode([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        # encode runs the model on the CPU for tens of milliseconds; keep it off the event loop
+        return (await asyncio.to_thread(self._encode, [query]))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await asyncio.to_thread(self._encode, [text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._encode, texts)
+
+
+class LazyEmbedding(BaseEmbedding):
+    """Embedding model that is only loaded the first time something is embedded.
+
+    Keeps torch and the model weights out of processes that never embed, and
+    lets the server start accepting requests before the model is in memory.
+    """
+
+    _loader: Callable[[], BaseEmbedding] = PrivateAttr()
+    _model: Optional[BaseEmbedding] = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr()
+    _load_seconds: Optional[float] = PrivateAttr(default=None)
+
+    def __init__(self, loader: Callable[[], BaseEmbedding], model_name: str, **kwargs: Any):
+        super().__init__(model_name=model_name, **kwargs)
+        self._loader = loader
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LazyEmbedding"
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def load_seconds(self) -> Optional[float]:
+        return self._load_seconds
+
+    @property
+    def model(self) -> BaseEmbedding:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = self._loader()
+                    self._load_seconds = time.perf_counter() - start
+                    print(f"Loaded embedding model {self.model_name} in {self._load_seconds:.2f}s")
+        return self._model
+
+    async def amodel(self) -> BaseEmbedding:
+        """The model, loaded in a worker thread so importing torch never blocks the event loop"""
+        if self._model is None:
+            await asyncio.to_thread(lambda: self.model)
+        return self._model
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await (await self.amodel()).aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self.model.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await (await self.amodel()).aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await (await self.amodel()).aget_text_embedding_batch(texts)
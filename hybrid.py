@@ -0,0 +1,188 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core import VectorStoreIndex # type: ignore
+from llama_index.core.base.base_retriever import BaseRetriever # type: ignore
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle # type: ignore
+from llama_index.core.vector_stores import ExactMatchFilter, MetadataFilters # type: ignore
+
+import ats
+
+# Compound tokens (node.js, ci/cd, az-900) are also indexed by their parts
+TOKEN_SEPARATORS = re.compile(r"[./-]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by does for from has have in is it of on or that the this "
+    "to was were which who with what candidate candidates resume resumes".split()
+)
+
+# Each side of a hybrid search returns this many times top_k candidates before fusion
+CANDIDATE_FACTOR = 2
+
+
+def get_retrieval_mode() -> str:
+    """RETRIEVAL_MODE is "hybrid" (the default) or "vector" for dense retrieval only"""
+    return os.getenv("RETRIEVAL_MODE", "hybrid")
+
+
+def get_retrieval_top_k() -> int:
+    """Chunks retrieved per question; sized for 256-token chunks, with the prompt budget trimming any excess"""
+    return int(os.getenv("RETRIEVAL_TOP_K", "8"))
+
+
+def get_hybrid_alpha() -> float:
+    """Weight of the vector score in the fused score; the rest goes to BM25"""
+    return float(os.getenv("HYBRID_ALPHA", "0.5"))
+
+
+def tokenize(text: str) -> List[str]:
+    """ATS tokens without stopwords, so BM25 and keyword scoring agree on what a term
+    is; compound tokens also yield their parts"""
+    terms = []
+    for token in ats.tokenize(text):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if TOKEN_SEPARATORS.search(token):
+            terms.extend(part for part in TOKEN_SEPARATORS.split(token) if part and part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """In-memory inverted index over chunk text, scored with Okapi BM25.
+
+    Nodes are added and removed one file at a time as the session changes, so
+    the index never has to be rebuilt. A lookup only touches the postings of
+    the query's terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.node_terms: Dict[str, Counter] = {}
+        self.node_lengths: Dict[str, int] = {}
+        self.node_files: Dict[str, Optional[str]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.node_terms)
+
+    def add_nodes(self, nodes: List[BaseNode]) -> None:
+        tokenized = [(node, Counter(tokenize(node.get_content(metadata_mode=MetadataMode.NONE)))) for node in nodes]
+        with self._lock:
+            for node, terms in tokenized:
+                if node.node_id in self.node_terms:
+                    self._remove(node.node_id)
+                self.node_terms[node.node_id] = terms
+                self.node_lengths[node.node_id] = sum(terms.values())
+                self.node_files[node.node_id] = node.metadata.get("file_name")
+                self.total_length += self.node_lengths[node.node_id]
+                for term, count in terms.items():
+                    self.postings.setdefault(term, {})[node.node_id] = count
+
+    def remove_nodes(self, node_ids: List[str]) -> None:
+        with self._lock:
+            for node_id in node_ids:
+                self._remove(node_id)
+
+    def _remove(self, node_id: str) -> None:
+        terms = self.node_terms.pop(node_id, None)
+        self.node_files.pop(node_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.node_lengths.pop(node_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(node_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, top_k: int, file_name: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Best (node_id, score) pairs for a query, optionally within one file"""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            node_count = len(self.node_terms)
+            if not node_count or not query_terms:
+                return []
+            average_length = self.total_length / node_count
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (node_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for node_id, count in posting.items():
+                    if file_name is not None and self.node_files.get(node_id) != file_name:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.node_lengths[node_id] / average_length)
+                    scores[node_id] = scores.get(node_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def normalize_scores(results: List[NodeWithScore]) -> Dict[str, float]:
+    """Min-max scale scores to [0, 1] so dense and BM25 scores can be added"""
+    scores = {result.node.node_id: result.score or 0.0 for result in results}
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {node_id: 1.0 for node_id in scores}
+    return {node_id: (score - low) / (high - low) for node_id, score in scores.items()}
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense retrieval from a vector index with BM25 over the same nodes.
+
+    Both sides fetch a few more candidates than top_k, their scores are
+    min-max normalized and added with weight alpha on the vector side, and the
+    best top_k are kept. The BM25 query is the retrieval string of the bundle
+    (the condensed question in chat), not the prompt sent to the LLM.
+    """
+
+    def __init__(self, index: VectorStoreIndex, sparse_index: BM25Index, top_k: int = 2,
+                 alpha: float = 0.5, file_name: Optional[str] = None):
+        super().__init__()
+        self.sparse_index = sparse_index
+        self.top_k = top_k
+        self.alpha = alpha
+        self.file_name = file_name
+        self.docstore = index.docstore
+        filters = None
+        if file_name is not None:
+            filters = MetadataFilters(filters=[ExactMatchFilter(key="file_name", value=file_name)])
+        self.vector_retriever = index.as_retriever(similarity_top_k=top_k * CANDIDATE_FACTOR, filters=filters)
+
+    def sparse_retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query = " ".join(query_bundle.embedding_strs)
+        results = []
+        for node_id, score in self.sparse_index.search(query, self.top_k * CANDIDATE_FACTOR, self.file_name):
+            node = self.docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                results.append(NodeWithScore(node=node, score=score))
+        return results
+
+    def fuse(self, dense: List[NodeWithScore], sparse: List[NodeWithScore]) -> List[NodeWithScore]:
+        dense_scores, sparse_scores = normalize_scores(dense), normalize_scores(sparse)
+        nodes = {result.node.node_id: result.node for result in dense + sparse}
+        fused = [
+            NodeWithScore(node=node, score=self.alpha * dense_scores.get(node_id, 0.0)
+                          + (1 - self.alpha) * sparse_scores.get(node_id, 0.0))
+            for node_id, node in nodes.items()
+        ]
+        fused.sort(key=lambda result: result.score, reverse=True)
+        return fused[:self.top_k]
+
+    # The vector retriever's own _retrieve is called so one search is one retrieval event
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self.fuse(self.vector_retriever._retrieve(query_bundle), self.sparse_retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense = await self.vector_retriever._aretrieve(query_bundle)
+        return self.fuse(dense, self.sparse_retrieve(query_bundle))
@@ -0,0 +1,300 @@
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from llama_index.core import Settings, SimpleDirectoryReader, VectorStoreIndex # type: ignore
+from llama_index.core.schema import BaseNode, Document, MetadataMode # type: ignore
+
+from chunking import get_chunking_config, get_chunking_key
+import metrics
+import profiles
+import search
+import storage
+
+# Files parsed at once in worker processes; 0 parses in the calling thread without a timeout
+PARSE_PROCESSES = int(os.getenv("INGEST_PARSE_PROCESSES", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+# Seconds a single file may take to parse before it is abandoned
+PARSE_TIMEOUT = float(os.getenv("INGEST_PARSE_TIMEOUT_SECONDS", "60"))
+
+# Parsed and embedded files by content hash and name, reused when the same file is ingested again
+ARTIFACT_DIR = os.getenv("INGEST_ARTIFACT_DIR", "ingest_artifacts") or None
+
+parse_pool: Optional["ParsePool"] = None
+parse_pool_lock = threading.Lock()
+
+
+class IngestError(Exception):
+    """Raised when a file can't be parsed, or takes longer than the parse timeout"""
+
+
+def get_display_name(original_name: str) -> str:
+    """Strip the upload timestamp prefix (e.g. 20250419_111011_) from a stored file name"""
+    parts = original_name.split('_', 2)
+    if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+        return parts[2]
+    return original_name
+
+
+def load_documents(file_path: str, display_name: str) -> List[Document]:
+    """Parse a file and tag every document with its source file name"""
+    documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
+    for doc in documents:
+        doc.metadata["file_name"] = display_name
+        # The upload path differs on every upload; kept out of the embedded text (and so
+        # the embedding cache key) and out of LLM prompts
+        for excluded in (doc.excluded_embed_metadata_keys, doc.excluded_llm_metadata_keys):
+            if "file_path" not in excluded:
+                excluded.append("file_path")
+    return documents
+
+
+def timed_load_documents(file_path: str, display_name: str) -> Tuple[List[Document], float]:
+    """load_documents plus the seconds it took; runs inside parse worker processes"""
+    start = time.perf_counter()
+    documents = load_documents(file_path, display_name)
+    return documents, time.perf_counter() - start
+
+
+def artifact_key(file_path: str, display_name: str) -> str:
+    """Artifacts are keyed on name as well as content, since the file name is part of the embedded text"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f"{digest.hexdigest()}:{display_name}"
+
+
+def get_artifact_name(key: str) -> str:
+    """Stored artifacts are per chunking config, since the nodes depend on it"""
+    return f"{key}:{get_chunking_key(get_chunking_config())}"
+
+
+def load_artifact(key: str, file_path: Optional[str] = None) -> Optional[Tuple[List[Document], List[BaseNode]]]:
+    """Previously ingested documents and embedded nodes for an artifact key, if stored.
+
+    The artifact still names the file it was first ingested from; with
+    file_path it is pointed at the current copy instead, so sessions hold on
+    to (and later clean up) the upload that is actually in use.
+    """
+    if ARTIFACT_DIR is None:
+        return None
+    try:
+        artifact = storage.load_named(ARTIFACT_DIR, get_artifact_name(key))
+    except Exception as e:
+        print(f"Ignoring unreadable ingest artifact {key}: {str(e)}")
+        return None
+    if artifact is not None and file_path is not None:
+        for item in artifact[0] + artifact[1]:
+            if "file_path" in item.metadata:
+                item.metadata["file_path"] = file_path
+    return artifact
+
+
+def save_artifact(key: str, documents: List[Document], nodes: List[BaseNode]) -> None:
+    if ARTIFACT_DIR is not None:
+        storage.persist_file(ARTIFACT_DIR, get_artifact_name(key), documents, nodes)
+
+
+def index_ingested(key: str, display_name: str, documents: List[Document], nodes: List[BaseNode]) -> None:
+    """Add an ingested resume to the /search pool and the profile store.
+
+    Both only do work the first time a file is seen; a failure in either is
+    logged and never fails the ingest.
+    """
+    try:
+        search.get_candidate_index().add(key, display_name, [node.embedding for node in nodes])
+    except Exception as e:
+        print(f"Could not add {display_name} to the search pool: {str(e)}")
+    try:
+        profiles.get_profile(key, display_name, "\n".join(doc.text for doc in documents))
+    except Exception as e:
+        print(f"Could not extract a profile for {display_name}: {str(e)}")
+
+
+def build_nodes(documents: List[Document], timings: Optional[Dict[str, float]] = None) -> List[BaseNode]:
+    """Chunk documents once and attach their embeddings to the nodes"""
+    start = time.perf_counter()
+    nodes = Settings.node_parser.get_nodes_from_documents(documents)
+    chunked = time.perf_counter()
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    embeddings = Settings.embed_model.get_text_embedding_batch(texts)
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    embedded = time.perf_counter()
+
+    metrics.observe("chunk", chunked - start)
+    metrics.observe("embed", embedded - chunked)
+    metrics.CHUNKS_EMBEDDED.inc(len(nodes))
+    if timings is not None:
+        timings["chunk"] = chunked - start
+        timings["embed"] = embedded - chunked
+    return nodes
+
+
+def run_parse_worker(conn) -> None:
+    """Parse worker process: run (function, args) tasks from the pipe until it closes"""
+    # Imports are done by now; the parent starts timing tasks from here
+    conn.send("ready")
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        function, args = task
+        try:
+            result = (True, function(*args))
+        except Exception as e:
+            result = (False, str(e))
+        conn.send(result)
+
+
+class ParsePool:
+    """Worker processes that parse files, shared by every request.
+
+    Each worker is a process fed by its own dispatcher thread, which takes
+    the next task from a shared queue when the worker is free. A task's
+    timeout starts when its worker picks it up, not when it was queued, so a
+    long batch never times out files that were merely waiting. A worker
+    still busy after the timeout is killed and replaced on its own; the
+    other workers, and other requests' parses, carry on.
+    """
+
+    def __init__(self, processes: int, timeout: float):
+        self.timeout = timeout
+        self._tasks: "queue.Queue[Tuple[Future, Callable, tuple]]" = queue.Queue()
+        # Spawned rather than forked: forking a process that has torch threads running can deadlock
+        self._context = multiprocessing.get_context("spawn")
+        for _ in range(processes):
+            threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def submit(self, function: Callable, *args: Any) -> Future:
+        future: Future = Future()
+        self._tasks.put((future, function, args))
+        return future
+
+    def _start_worker(self):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=run_parse_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        # Starting Python and importing the parsers is not part of any file's timeout
+        try:
+            conn.recv()
+        except EOFError:
+            process.join()
+            raise
+        return process, conn
+
+    def _dispatch(self) -> None:
+        process, conn = None, None
+        while True:
+            future, function, args = self._tasks.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if process is None or not process.is_alive():
+                    process, conn = self._start_worker()
+                future.started = time.perf_counter()
+                conn.send((function, args))
+                if conn.poll(self.timeout):
+                    ok, result = conn.recv()
+                    if ok:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(IngestError(result))
+                    continue
+                error = IngestError(f"Parsing timed out after {self.timeout:.0f}s")
+            except (EOFError, OSError) as e:
+                error = IngestError(f"Parse worker exited: {str(e) or 'no result'}")
+            # The worker is hung or gone; only it is replaced
+            if process is not None:
+                process.kill()
+                process.join()
+                conn.close()
+            process, conn = None, None
+            future.set_exception(error)
+
+
+def get_parse_pool() -> ParsePool:
+    global parse_pool
+    with parse_pool_lock:
+        if parse_pool is None:
+            parse_pool = ParsePool(PARSE_PROCESSES, PARSE_TIMEOUT)
+        return parse_pool
+
+
+def ingest_files(file_paths: List[Tuple[str, str]]) -> Iterator[Dict[str, object]]:
+    """Parse files in worker processes and chunk and embed each one as soon as it is parsed.
+
+    Yields one result per file, in completion order:
+    {"name", "documents", "nodes", "timings"} on success, or {"name", "error", "timings"}
+    when a file fails to parse or exceeds the parse timeout. Timings are seconds per
+    stage: queue (waiting for a parse worker), parse, chunk and embed, or just
+    reuse for a file whose artifacts were already stored.
+    """
+    to_parse = []
+    for file_path, original_name in file_paths:
+        display_name = get_display_name(original_name)
+        start = time.perf_counter()
+        try:
+            key = artifact_key(file_path, display_name)
+        except OSError as e:
+            yield {"name": display_name, "error": str(e), "timings": {}}
+            continue
+        artifact = load_artifact(key, file_path)
+        if artifact is None:
+            to_parse.append((file_path, display_name, key))
+            continue
+        documents, nodes = artifact
+        index_ingested(key, display_name, documents, nodes)
+        yield {"name": display_name, "documents": documents, "nodes": nodes,
+               "timings": {"reuse": time.perf_counter() - start}}
+
+    if PARSE_PROCESSES <= 0:
+        for file_path, display_name, key in to_parse:
+            timings = {"queue": 0.0}
+            try:
+                documents, timings["parse"] = timed_load_documents(file_path, display_name)
+                metrics.observe("parse", timings["parse"])
+                nodes = build_nodes(documents, timings)
+                save_artifact(key, documents, nodes)
+                index_ingested(key, display_name, documents, nodes)
+                yield {"name": display_name, "documents": documents, "nodes": nodes, "timings": timings}
+            except Exception as e:
+                yield {"name": display_name, "error": str(e), "timings": timings}
+        return
+    if not to_parse:
+        return
+
+    pool = get_parse_pool()
+    submitted = time.perf_counter()
+    pending = {}
+    for file_path, display_name, key in to_parse:
+        pending[pool.submit(timed_load_documents, file_path, display_name)] = (display_name, key)
+
+    # Every file's parse timeout is enforced by the pool from when a worker picks it up
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            display_name, key = pending.pop(future)
+            timings = {"queue": getattr(future, "started", submitted) - submitted}
+            try:
+                documents, timings["parse"] = future.result()
+                metrics.observe("parse", timings["parse"])
+                nodes = build_nodes(documents, timings)
+                save_artifact(key, documents, nodes)
+                index_ingested(key, display_name, documents, nodes)
+                yield {"name": display_name, "documents": documents, "nodes": nodes, "timings": timings}
+            except Exception as e:
+                yield {"name": display_name, "error": str(e), "timings": timings}
+
+
+def build_index(nodes: List[BaseNode]) -> VectorStoreIndex:
+    """Build an index from already embedded nodes without re-running the embedding model"""
+    return VectorStoreIndex(nodes=nodes)
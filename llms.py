@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Iterator, List
+
+from llama_index.core import PromptTemplate # type: ignore
+from llama_index.core.base.llms.types import CompletionResponse, CompletionResponseGen, LLMMetadata # type: ignore
+from llama_index.core.llms import LLM # type: ignore
+from llama_index.core.llms.callbacks import llm_completion_callback # type: ignore
+from llama_index.core.llms.custom import CustomLLM # type: ignore
+
+DEFAULT_GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+LLM_PROVIDERS = ("groq", "stub", "llama-cpp")
+
+
+def get_llm_config() -> Dict[str, Any]:
+    """LLM provider settings from the environment.
+
+    LLM_PROVIDER is one of:
+      groq       the hosted Groq API (needs GROQ_API_KEY)
+      stub       a deterministic local stand-in with configurable latency and token
+                 rate, for offline load testing; its answers are not meaningful
+      llama-cpp  a local GGUF model through llama-cpp-python, from LLAMA_CPP_MODEL_PATH
+    """
+    provider = os.getenv("LLM_PROVIDER", "groq")
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {provider!r}, expected one of {', '.join(LLM_PROVIDERS)}")
+    threads = os.getenv("LLAMA_CPP_THREADS")
+    return {
+        "provider": provider,
+        "model_name": os.getenv("LLM_MODEL", DEFAULT_GROQ_MODEL),
+        "stub_latency": float(os.getenv("STUB_LLM_LATENCY_SECONDS", "0.5")),
+        "stub_tokens_per_second": float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "200")),
+        "stub_answer_tokens": int(os.getenv("STUB_LLM_ANSWER_TOKENS", "150")),
+        "llama_cpp_model_path": os.getenv("LLAMA_CPP_MODEL_PATH") or None,
+        "llama_cpp_threads": int(threads) if threads else None
+    }
+
+
+def load_llm(config: Dict[str, Any], context_window: int, max_new_tokens: int,
+             system_prompt: str, query_wrapper_prompt: PromptTemplate) -> LLM:
+    """Build the LLM for a provider config; provider packages are only imported when selected"""
+    if config["provider"] == "stub":
+        return StubLLM(
+            latency=config["stub_latency"],
+            tokens_per_second=config["stub_tokens_per_second"],
+            answer_tokens=min(config["stub_answer_tokens"], max_new_tokens),
+            context_window=context_window,
+            num_output=max_new_tokens,
+            system_prompt=system_prompt,
+            query_wrapper_prompt=query_wrapper_prompt
+        )
+
+    if config["provider"] == "llama-cpp":
+        from llama_index.llms.llama_cpp import LlamaCPP # type: ignore
+
+        if not config["llama_cpp_model_path"]:
+            raise ValueError("LLM_PROVIDER=llama-cpp needs LLAMA_CPP_MODEL_PATH set to a GGUF file")
+        model_kwargs = {"n_threads": config["llama_cpp_threads"]} if config["llama_cpp_threads"] else {}
+        return LlamaCPP(
+            model_path=config["llama_cpp_model_path"],
+            context_window=context_window,
+            max_new_tokens=max_new_tokens,
+            temperature=0.0,
+            model_kwargs=model_kwargs,
+            system_prompt=system_prompt,
+            query_wrapper_prompt=query_wrapper_prompt,
+            verbose=False
+        )
+
+    from llama_index.llms.groq import Groq # type: ignore
+
+    # The Groq HTTP client itself is only created on the first request
+    return Groq(
+        model=config["model_name"],
+        api_key=os.getenv("GROQ_API_KEY"),
+        context_window=context_window,
+        max_tokens=max_new_tokens,
+        temperature=0.0,
+        system_prompt=system_prompt,
+        query_wrapper_prompt=query_wrapper_prompt
+    )
+
+
+class StubLLM(CustomLLM):
+    """Local stand-in for the hosted LLM.
+
+    Waits `latency` seconds before the first token, then produces
+    `answer_tokens` words at `tokens_per_second` (0 means all at once). The
+    words are drawn from the prompt with a seed taken from its hash, so the
+    same prompt always gets the same answer and no network is touched.
+    """
+
+    latency: float = 0.5
+    tokens_per_second: float = 200.0
+    answer_tokens: int = 150
+    context_window: int = 4096
+    num_output: int = 1024
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=self.context_window, num_output=self.num_output,
+                           model_name="stub")
+
+    def answer_words(self, prompt: str) -> List[str]:
+        vocabulary = re.findall(r"[A-Za-z][A-Za-z0-9+#.]*", prompt) or ["stub"]
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        return [rng.choice(vocabulary) for _ in range(self.answer_tokens)]
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def total_delay(self) -> float:
+        return self.latency + self.answer_tokens * self.token_delay()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.total_delay())
+        return CompletionResponse(text=" ".join(self.answer_words(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        words = self.answer_words(prompt)
+
+        def gen() -> Iterator[CompletionResponse]:
+            time.sleep(self.latency)
+            text = ""
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                text += delta
+                time.sleep(self.token_delay())
+                yield CompletionResponse(text=text, delta=delta)
+
+        return gen()
+
+    # Sleep without blocking the event loop, like a real network client
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep(self.total_delay())
+        return CompletionResponse(text=" ".join(self.answer_words(prompt)))
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        words = self.answer_words(prompt)
+
+        async def gen():
+            await asyncio.sleep(self.latency)
+            text = ""
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                text += delta
+                await asyncio.sleep(self.token_delay())
+                yield CompletionResponse(text=text, delta=delta)
+
+        return gen()
@@ -1,10 +1,11 @@
-from llama_index.llms.groq import Groq # type: ignore
 from llama_index.core import PromptTemplate # type: ignore
-from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
 from llama_index.core import Settings # type: ignore
-from llama_index.embeddings.langchain import LangchainEmbedding # type: ignore
-from llama_index.core.node_parser import SentenceSplitter # type: ignore
-import os
+from chunking import get_chunking_config, load_node_parser
+from embedding_cache import CachedEmbedding, get_embedding_cache
+from llms import get_llm_config, load_llm
+from prompts import count_tokens, load_tokenizer
+from embeddings import LazyEmbedding, get_cache_model_name, get_embedding_config, load_embedding_model
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -17,22 +18,40 @@ def get_llm_settings(contect_window: int, max_new_token: int):
 
     query_wrapper_prompt = PromptTemplate("<|USER|>{query_str}<|ASSISTANT|>")
 
-    llm = Groq(
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        api_key=os.getenv("GROQ_API_KEY"),
-        context_window=contect_window,
-        max_tokens=max_new_token,
-        temperature=0.0,
-        system_prompt=system_prompt,
-        query_wrapper_prompt=query_wrapper_prompt
+    # Groq by default; LLM_PROVIDER=stub or llama-cpp runs without network access
+    llm = load_llm(get_llm_config(), contect_window, max_new_token, system_prompt, query_wrapper_prompt)
+
+    # Torch and the model weights are loaded the first time a chunk misses the cache
+    embedding_config = get_embedding_config()
+    embed_model = LazyEmbedding(
+        lambda: load_embedding_model(embedding_config),
+        model_name=embedding_config["model_name"],
+        embed_batch_size=embedding_config["batch_size"]
     )
 
-    embed_model = LangchainEmbedding(
-        HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2"))
+    # Serve previously seen chunks from the disk-backed embedding cache
+    embedding_cache = get_embedding_cache(get_cache_model_name(embedding_config))
+    if embedding_cache is not None:
+        embed_model = CachedEmbedding(embed_model, embedding_cache)
 
     Settings.llm = llm
     Settings.embed_model = embed_model
-    Settings.node_parser = SentenceSplitter(chunk_size=1024)
+    # Prompt budgets and token metrics count with the LLM's own tokenizer when LLM_TOKENIZER names it
+    Settings.tokenizer = load_tokenizer()
+    count_tokens.cache_clear()
+    # Section-aware resume chunks by default; CHUNKING_STRATEGY=sentence for plain sentence windows
+    Settings.node_parser = load_node_parser(get_chunking_config())
     settings = Settings
 
-    return settings
\ No newline at end of file
+    return settings
+
+def warm_up(settings):
+    """Load the embedding model and run one forward pass so the first request doesn't pay for it"""
+    start = time.perf_counter()
+    embed_model = settings.embed_model
+    if isinstance(embed_model, CachedEmbedding):
+        embed_model = embed_model.base
+    if isinstance(embed_model, LazyEmbedding):
+        embed_model = embed_model.model
+    embed_model.get_text_embedding("warm up")
+    return time.perf_counter() - start
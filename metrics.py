@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram # type: ignore
+from llama_index.core.bridge.pydantic import PrivateAttr # type: ignore
+from llama_index.core.instrumentation import get_dispatcher # type: ignore
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler # type: ignore
+from llama_index.core.instrumentation.events.llm import ( # type: ignore
+    LLMChatEndEvent, LLMChatStartEvent, LLMCompletionEndEvent, LLMCompletionStartEvent
+)
+from llama_index.core.instrumentation.events.retrieval import RetrievalEndEvent, RetrievalStartEvent # type: ignore
+
+from prompts import count_tokens
+
+STAGE_SECONDS = Histogram(
+    "resume_stage_seconds",
+    "Seconds spent in each stage of handling a request",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+CHUNKS_EMBEDDED = Counter("resume_chunks_embedded_total", "Chunks produced and embedded by ingest")
+LLM_CALLS = Counter("resume_llm_calls_total", "Calls made to the LLM")
+LLM_TOKENS = Counter("resume_llm_tokens_total", "Tokens sent to and generated by the LLM", ["direction"])
+LLM_PROMPT_TOKENS = Histogram(
+    "resume_llm_prompt_tokens",
+    "Tokens in each prompt sent to the LLM",
+    buckets=(128, 256, 512, 1024, 1536, 2048, 2560, 3072, 3584, 4096, 8192, 16384)
+)
+UPLOADED_BYTES = Counter("resume_uploaded_bytes_total", "Bytes of uploaded files saved to disk")
+INDEX_MEMORY_BYTES = Gauge("resume_index_memory_bytes", "Estimated memory held by live session indices")
+DOC_STORE_FILES = Gauge("resume_doc_store_files", "Files held in live sessions' document stores")
+LIVE_SESSIONS = Gauge("resume_live_sessions", "Sessions currently held in memory")
+
+# Stage seconds for the request being handled, if any; read back into the Server-Timing header
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+timings_lock = threading.Lock()
+# LLM calls and tokens for the request being handled; read back into the X-LLM-Tokens header
+request_tokens: ContextVar[Optional[Dict[str, int]]] = ContextVar("request_tokens", default=None)
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record time spent in a stage, both in the histogram and for the current request"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        with timings_lock:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Server-Timing header value, durations in milliseconds"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def format_token_usage(usage: Dict[str, int]) -> str:
+    """X-LLM-Tokens header value"""
+    return ", ".join(f"{key}={value}" for key, value in usage.items())
+
+
+def record_llm_call(prompt_tokens: int, completion_tokens: int) -> None:
+    LLM_CALLS.inc()
+    LLM_TOKENS.labels("prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels("completion").inc(completion_tokens)
+    LLM_PROMPT_TOKENS.observe(prompt_tokens)
+    usage = request_tokens.get()
+    if usage is not None:
+        with timings_lock:
+            usage["calls"] = usage.get("calls", 0) + 1
+            usage["prompt"] = usage.get("prompt", 0) + prompt_tokens
+            usage["completion"] = usage.get("completion", 0) + completion_tokens
+
+
+class StageTimingHandler(BaseEventHandler):
+    """Times retrieval and LLM calls from LlamaIndex instrumentation events.
+
+    Start and end events of one call share a span ID, which works for any
+    query engine without wrapping it. Token counts use the prompt budgeting
+    tokenizer, so they are exact only when LLM_TOKENIZER is set.
+    """
+
+    _started: Dict[str, float] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StageTimingHandler"
+
+    def handle(self, event, **kwargs: Any) -> None:
+        if isinstance(event, (RetrievalStartEvent, LLMCompletionStartEvent, LLMChatStartEvent)):
+            with self._lock:
+                self._started[f"{type(event).__name__}:{event.span_id}"] = time.perf_counter()
+        elif isinstance(event, RetrievalEndEvent):
+            self.finish("retrieve", RetrievalStartEvent, event)
+        elif isinstance(event, LLMCompletionEndEvent):
+            if self.finish("llm", LLMCompletionStartEvent, event):
+                record_llm_call(count_tokens(event.prompt), count_tokens(event.response.text))
+        elif isinstance(event, LLMChatEndEvent):
+            if self.finish("llm", LLMChatStartEvent, event):
+                completion = str(event.response.message.content or "") if event.response is not None else ""
+                record_llm_call(sum(count_tokens(str(m.content or "")) for m in event.messages),
+                                count_tokens(completion))
+
+    def finish(self, stage: str, start_type, event) -> bool:
+        with self._lock:
+            started = self._started.pop(f"{start_type.__name__}:{event.span_id}", None)
+        if started is None:
+            return False
+        observe(stage, time.perf_counter() - started)
+        return True
+
+
+def install_stage_timing() -> None:
+    """Send LlamaIndex retrieval and LLM events to the stage metrics"""
+    dispatcher = get_dispatcher()
+    if not any(isinstance(handler, StageTimingHandler) for handler in dispatcher.event_handlers):
+        dispatcher.add_event_handler(StageTimingHandler())
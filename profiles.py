@@ -0,0 +1,357 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+# Canonical spellings of the skills recognized in resumes
+SKILLS = [
+    "Python", "Java", "Go", "Golang", "Rust", "C", "C++", "C#", "TypeScript", "JavaScript", "Scala",
+    "Kotlin", "Swift", "Ruby", "PHP", "R", "MATLAB", "Bash", "Perl",
+    "SQL", "PostgreSQL", "MySQL", "SQLite", "Oracle", "MongoDB", "Redis", "Cassandra", "DynamoDB",
+    "Elasticsearch", "Snowflake", "BigQuery", "Redshift",
+    "Kafka", "RabbitMQ", "Spark", "PySpark", "Airflow", "dbt", "Hadoop", "Flink", "Databricks",
+    "Docker", "Kubernetes", "Terraform", "Ansible", "Jenkins", "GitHub Actions", "GitLab CI", "Helm",
+    "CI/CD", "AWS", "GCP", "Google Cloud", "Azure", "Lambda", "S3", "EC2",
+    "React", "Angular", "Vue", "Node.js", "Next.js", "Django", "Flask", "FastAPI", "Spring",
+    "Spring Boot", ".NET", "Rails", "HTML", "CSS",
+    "TensorFlow", "PyTorch", "Keras", "scikit-learn", "Pandas", "NumPy", "LLMs", "NLP",
+    "Computer Vision", "Machine Learning", "Deep Learning", "Data Analysis", "Statistics",
+    "Tableau", "Power BI", "Excel",
+    "GraphQL", "gRPC", "REST APIs", "Microservices", "Linux", "Git", "Prometheus", "Grafana",
+    "Agile", "Scrum", "Jira",
+]
+# Ordinary words too; these only count when written with their usual capitalization
+CASE_SENSITIVE_SKILLS = frozenset(["Go", "C", "R", "Swift", "Spring", "Rails", "Excel", "Lambda", "Git"])
+
+SKILL_PATTERNS = [
+    (skill, re.compile(r"(?<![\w+#.])" + re.escape(skill) + r"(?![\w+#]|\.\w)",
+                       0 if skill in CASE_SENSITIVE_SKILLS else re.IGNORECASE))
+    for skill in SKILLS
+]
+
+MONTHS = {name: number for number, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+DATE = r"(?:(?P<{p}month>" + MONTH + r")\s+|(?P<{p}number>\d{{1,2}})[/.-])?(?P<{p}year>(?:19|20)\d{{2}})"
+DATE_RANGE = re.compile(
+    DATE.format(p="start_") + r"\s*(?:-|–|—|to|until)\s*(?:"
+    + DATE.format(p="end_") + r"|(?P<present>present|current|now|today))",
+    re.IGNORECASE
+)
+YEARS_STATED = re.compile(r"(\d{1,2})\+?\s+years?\s+of\s+(?:professional\s+|industry\s+|work\s+)?experience",
+                          re.IGNORECASE)
+
+TITLE_WORDS = re.compile(
+    r"\b(?:engineer|developer|programmer|architect|scientist|analyst|manager|lead|director|head|"
+    r"consultant|designer|administrator|specialist|intern|officer|researcher|vp|cto|ceo)\b",
+    re.IGNORECASE
+)
+POSITION_SEPARATORS = re.compile(r"\s+(?:-|–|—|\||@|at)\s+|,\s+|\s{2,}|\t")
+
+# (level, rank, pattern) from the highest degree down
+DEGREE_LEVELS = [
+    ("phd", 4, r"ph\.?\s?d\b|doctor(?:ate)?\s+of\b|doctorate\b"),
+    ("master", 3, r"master'?s?\b|m\.?\s?sc\b|m\.\s?s\.|m\.?\s?eng\b|m\.?\s?tech\b|mba\b|m\.a\."),
+    ("bachelor", 2, r"bachelor'?s?\b|b\.?\s?sc\b|b\.\s?s\.|b\.?\s?eng\b|b\.?\s?tech\b|b\.a\.|b\.e\."),
+    ("associate", 1, r"associate'?s?\s+degree|associate\s+of\b"),
+]
+DEGREE_PATTERNS = [(level, rank, re.compile(r"(?<![a-z])(?:" + pattern + ")", re.IGNORECASE))
+                   for level, rank, pattern in DEGREE_LEVELS]
+DEGREE_RANKS = {level: rank for level, rank, _ in DEGREE_LEVELS}
+
+EDUCATION_HEADINGS = ("education", "academic", "qualifications")
+OTHER_HEADINGS = ("experience", "employment", "work history", "skills", "summary", "profile", "projects",
+                  "certifications", "languages", "interests", "publications", "awards", "objective")
+
+profile_store = None
+profile_store_lock = threading.Lock()
+
+
+def month_index(year: str, month: Optional[str], number: Optional[str]) -> int:
+    """Months since year 0, so ranges can be merged with plain integer arithmetic"""
+    if month:
+        value = MONTHS[month[:3].lower()]
+    elif number and 1 <= int(number) <= 12:
+        value = int(number)
+    else:
+        value = 1
+    return int(year) * 12 + value - 1
+
+
+def format_month(index: Optional[int]) -> Optional[str]:
+    return None if index is None else f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def heading_section(line: str) -> Optional[str]:
+    """"education" or "other" if the line is a section heading, else None"""
+    text = line.strip().rstrip(":").lower()
+    if not text or len(text) > 40:
+        return None
+    if any(text.startswith(heading) or text.endswith(heading) for heading in EDUCATION_HEADINGS):
+        return "education"
+    if any(heading in text for heading in OTHER_HEADINGS):
+        return "other"
+    return None
+
+
+def split_position(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(title, employer) from the text around a date range"""
+    parts = [part.strip(" ()[]|,-–—•*") for part in POSITION_SEPARATORS.split(text)]
+    parts = [part for part in parts if part]
+    title = next((part for part in parts if TITLE_WORDS.search(part)), None)
+    employer = next((part for part in parts if part != title), None)
+    return title, employer
+
+
+def extract_degree(line: str) -> Optional[Dict[str, Any]]:
+    for level, rank, pattern in DEGREE_PATTERNS:
+        match = pattern.search(line)
+        if match is None:
+            continue
+        rest = DATE_RANGE.sub("", line[match.end():])
+        rest = re.sub(r"\(?\b(?:19|20)\d{2}\b\)?", "", rest)
+        # "Bachelor of Science in Computer Science": the subject follows "in" when there is one
+        subject = (re.search(r"\bin\s+(.+)", rest, re.IGNORECASE)
+                   or re.search(r"\bof\s+(.+)", rest, re.IGNORECASE))
+        field = (subject.group(1) if subject else rest).split(",")[0].strip(" .()-–—:|")
+        return {"level": level, "field": field[:80] or None}
+    return None
+
+
+def merged_months(ranges: List[Tuple[int, int]]) -> int:
+    """Months covered by a set of ranges, counting overlapping jobs once"""
+    total, current_start, current_end = 0, None, None
+    for start, end in sorted(ranges):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def extract_profile(text: str) -> Dict[str, Any]:
+    """Skills, positions, degrees and years of experience found in resume text.
+
+    Rule based: skills come from a fixed vocabulary, positions from lines with
+    a date range outside the education section, degrees from common degree
+    spellings. Fields are best effort and empty when nothing matches.
+    """
+    now = time.localtime()
+    present = now.tm_year * 12 + now.tm_mon - 1
+    skills = [skill for skill, pattern in SKILL_PATTERNS if pattern.search(text)]
+
+    positions, degrees = [], []
+    section, previous = None, ""
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        heading = heading_section(stripped)
+        if heading is not None:
+            section = heading
+            continue
+
+        degree = extract_degree(stripped)
+        if degree is not None and degree not in degrees:
+            degrees.append(degree)
+
+        match = DATE_RANGE.search(stripped)
+        if match is not None and section != "education" and degree is None:
+            start = month_index(match.group("start_year"), match.group("start_month"), match.group("start_number"))
+            end = present if match.group("present") else month_index(
+                match.group("end_year"), match.group("end_month"), match.group("end_number"))
+            around = (stripped[:match.start()] + "  " + stripped[match.end():]).strip(" ()[]|,-–—")
+            title, employer = split_position(around or previous)
+            if start <= end:
+                positions.append({"title": title, "employer": employer, "start": start,
+                                  "end": None if match.group("present") else end, "months": end - start})
+        previous = stripped
+
+    if positions:
+        years = merged_months([(p["start"], p["start"] + p["months"]) for p in positions]) / 12
+    else:
+        stated = [int(value) for value in YEARS_STATED.findall(text)]
+        years = max(stated) if stated else None
+
+    highest = max(degrees, key=lambda degree: DEGREE_RANKS[degree["level"]], default=None)
+    return {
+        "skills": skills,
+        "positions": [{"title": p["title"], "employer": p["employer"], "start": format_month(p["start"]),
+                       "end": format_month(p["end"])} for p in positions],
+        "degrees": degrees,
+        "years_experience": round(years, 1) if years is not None else None,
+        "highest_degree": highest["level"] if highest else None
+    }
+
+
+class ProfileStore:
+    """Extracted resume fields in SQLite, indexed for filter-style queries.
+
+    One row per ingested file (keyed like the ingest artifacts, by content hash
+    and name) in profiles, with skills, positions and degrees in child tables.
+    Skills have a case-insensitive (skill, profile) primary key, so "who
+    knows Kafka and Go with 5+ years" is a couple of index lookups.
+    """
+
+    def __init__(self, store_dir: str):
+        os.makedirs(store_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(store_dir, "profiles.sqlite3"), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                file_name TEXT NOT NULL,
+                years_experience REAL,
+                highest_degree TEXT,
+                degree_rank INTEGER NOT NULL DEFAULT 0,
+                extracted_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_profiles_file_name ON profiles (file_name);
+            CREATE INDEX IF NOT EXISTS idx_profiles_years ON profiles (years_experience);
+            CREATE INDEX IF NOT EXISTS idx_profiles_degree ON profiles (degree_rank);
+            CREATE TABLE IF NOT EXISTS skills (
+                skill TEXT NOT NULL COLLATE NOCASE,
+                profile_id INTEGER NOT NULL,
+                PRIMARY KEY (skill, profile_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS positions (
+                profile_id INTEGER NOT NULL,
+                title TEXT,
+                employer TEXT,
+                start_month TEXT,
+                end_month TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_positions_profile ON positions (profile_id);
+            CREATE TABLE IF NOT EXISTS degrees (
+                profile_id INTEGER NOT NULL,
+                level TEXT NOT NULL,
+                field TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_degrees_profile ON degrees (profile_id);
+        """)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM profiles WHERE key = ?", (key,)).fetchone()
+            return self._load([row[0]])[0] if row else None
+
+    def save(self, key: str, file_name: str, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM profiles WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                for table in ("skills", "positions", "degrees"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE profile_id = ?", (row[0],))
+                self._conn.execute("DELETE FROM profiles WHERE id = ?", (row[0],))
+            profile_id = self._conn.execute(
+                "INSERT INTO profiles (key, file_name, years_experience, highest_degree, degree_rank, extracted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, file_name, profile["years_experience"], profile["highest_degree"],
+                 DEGREE_RANKS.get(profile["highest_degree"], 0), time.time())
+            ).lastrowid
+            self._conn.executemany("INSERT OR IGNORE INTO skills (skill, profile_id) VALUES (?, ?)",
+                                   [(skill, profile_id) for skill in profile["skills"]])
+            self._conn.executemany(
+                "INSERT INTO positions (profile_id, title, employer, start_month, end_month) VALUES (?, ?, ?, ?, ?)",
+                [(profile_id, p["title"], p["employer"], p["start"], p["end"]) for p in profile["positions"]]
+            )
+            self._conn.executemany("INSERT INTO degrees (profile_id, level, field) VALUES (?, ?, ?)",
+                                   [(profile_id, d["level"], d["field"]) for d in profile["degrees"]])
+            self._conn.commit()
+
+    def find(self, skills: Optional[List[str]] = None, min_years: Optional[float] = None,
+             degree: Optional[str] = None, file_names: Optional[List[str]] = None,
+             keys: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Profiles with every one of skills, at least min_years and degree or higher,
+        most experienced first"""
+        conditions, params = [], []
+        if skills:
+            skills = sorted({skill.lower() for skill in skills})
+            conditions.append(
+                f"p.id IN (SELECT profile_id FROM skills WHERE skill IN ({','.join('?' * len(skills))}) "
+                f"GROUP BY profile_id HAVING COUNT(*) = ?)"
+            )
+            params += skills + [len(skills)]
+        if min_years is not None:
+            conditions.append("p.years_experience >= ?")
+            params.append(min_years)
+        if degree:
+            if degree not in DEGREE_RANKS:
+                raise ValueError(f"Unknown degree {degree!r}, expected one of {', '.join(DEGREE_RANKS)}")
+            conditions.append("p.degree_rank >= ?")
+            params.append(DEGREE_RANKS[degree])
+        if file_names:
+            conditions.append(f"p.file_name IN ({','.join('?' * len(file_names))})")
+            params += list(file_names)
+        if keys:
+            conditions.append(f"p.key IN ({','.join('?' * len(keys))})")
+            params += list(keys)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                f"SELECT p.id FROM profiles p {where} "
+                f"ORDER BY p.years_experience IS NULL, p.years_experience DESC, p.id LIMIT ?",
+                params + [limit]
+            )]
+            return self._load(ids)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"profiles": self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]}
+
+    def _load(self, ids: List[int]) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        profiles = {row[0]: {"key": row[4], "file_name": row[1], "years_experience": row[2],
+                             "highest_degree": row[3], "skills": [], "positions": [], "degrees": []}
+                    for row in self._conn.execute(
+                        f"SELECT id, file_name, years_experience, highest_degree, key FROM profiles "
+                        f"WHERE id IN ({placeholders})", ids)}
+        for profile_id, skill in self._conn.execute(
+                f"SELECT profile_id, skill FROM skills WHERE profile_id IN ({placeholders})", ids):
+            profiles[profile_id]["skills"].append(skill)
+        for profile_id, title, employer, start, end in self._conn.execute(
+                f"SELECT profile_id, title, employer, start_month, end_month FROM positions "
+                f"WHERE profile_id IN ({placeholders}) ORDER BY rowid", ids):
+            profiles[profile_id]["positions"].append({"title": title, "employer": employer,
+                                                      "start": start, "end": end})
+        for profile_id, level, field in self._conn.execute(
+                f"SELECT profile_id, level, field FROM degrees WHERE profile_id IN ({placeholders}) "
+                f"ORDER BY rowid", ids):
+            profiles[profile_id]["degrees"].append({"level": level, "field": field})
+        return [profiles[profile_id] for profile_id in ids if profile_id in profiles]
+
+
+def get_profile_store() -> Optional[ProfileStore]:
+    """The process-wide profile store in PROFILE_STORE_DIR, or None if disabled"""
+    global profile_store
+    store_dir = os.getenv("PROFILE_STORE_DIR", "profile_store")
+    if not store_dir:
+        return None
+    with profile_store_lock:
+        if profile_store is None:
+            profile_store = ProfileStore(store_dir)
+        return profile_store
+
+
+def get_profile(key: str, display_name: str, text: str) -> Dict[str, Any]:
+    """The stored profile for an ingested file, extracting and storing it on first sight"""
+    store = get_profile_store()
+    profile = store.get(key) if store is not None else None
+    if profile is None:
+        with metrics.timed("extract"):
+            profile = extract_profile(text)
+        if store is not None:
+            store.save(key, display_name, profile)
+        profile = {"file_name": display_name, **profile}
+    return profile
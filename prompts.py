@@ -0,0 +1,150 @@
+import os
+import re
+import textwrap
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
+
+from llama_index.core import Settings # type: ignore
+from llama_index.core.postprocessor.types import BaseNodePostprocessor # type: ignore
+from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT_TMPL # type: ignore
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode # type: ignore
+
+# Budget kept free for template text, message framing and tokenizer disagreements
+PROMPT_MARGIN_TOKENS = 64
+# Without the model's own tokenizer the counts are an estimate, so only this share of the window is planned for
+APPROXIMATE_TOKENIZER_SHARE = 0.9
+# A chunk cut shorter than this is dropped rather than sent as a fragment
+MIN_CHUNK_TOKENS = 64
+
+
+def load_tokenizer(name: Optional[str] = None) -> Callable[[str], List[Any]]:
+    """Tokenizer for prompt budgeting.
+
+    LLM_TOKENIZER names a Hugging Face tokenizer (or a local path) matching the
+    LLM, e.g. a Llama tokenizer for the Groq Llama models. Unset, LlamaIndex's
+    default tiktoken encoding is used and budgets keep a safety margin.
+    """
+    name = name if name is not None else os.getenv("LLM_TOKENIZER", "")
+    if not name:
+        return Settings.tokenizer
+    from transformers import AutoTokenizer # type: ignore
+
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    return lambda text: tokenizer.encode(text, add_special_tokens=False)
+
+
+def is_exact_tokenizer() -> bool:
+    return bool(os.getenv("LLM_TOKENIZER"))
+
+
+# Instructions, chat turns and chunks are recounted on every request; their counts are memoized
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    return len(Settings.tokenizer(text)) if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, keeping the beginning"""
+    # Counted directly: the intermediate cuts would only crowd the memoized counts out
+    tokens = len(Settings.tokenizer(text)) if text else 0
+    while tokens > max_tokens and text:
+        text = text[:max(0, int(len(text) * max_tokens / tokens) - 1)]
+        tokens = len(Settings.tokenizer(text)) if text else 0
+    return text
+
+
+def compact(text: str) -> str:
+    """Strip the indentation and blank-line runs that source-code prompt literals carry"""
+    text = textwrap.dedent(text).strip()
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
+def available_tokens() -> int:
+    """Prompt tokens one LLM call can take: the context window less the answer,
+    the system prompt and a margin"""
+    metadata = Settings.llm.metadata
+    window = metadata.context_window
+    if not is_exact_tokenizer():
+        window = int(window * APPROXIMATE_TOKENIZER_SHARE)
+    system_prompt = getattr(Settings.llm, "system_prompt", None) or ""
+    return window - metadata.num_output - count_tokens(system_prompt) - PROMPT_MARGIN_TOKENS
+
+
+def get_min_context_tokens() -> int:
+    """Tokens always left for retrieved chunks, however long the question and history"""
+    return int(available_tokens() * float(os.getenv("PROMPT_CONTEXT_SHARE", "0.5")))
+
+
+def fit_prompt(question: str, instructions: str = "", optional_instructions: str = "") -> str:
+    """The prompt for one question, shrunk until it leaves room for retrieved chunks.
+
+    Optional instructions (such as an output format) are dropped first, then
+    the instructions are cut from the end; the question is only truncated if
+    it doesn't fit on its own.
+    """
+    limit = available_tokens() - count_tokens(DEFAULT_TEXT_QA_PROMPT_TMPL) - get_min_context_tokens()
+    question = compact(question)
+    for parts in ((instructions, optional_instructions), (instructions,)):
+        prompt = "\n\n".join(compact(part) for part in parts + (question,) if part)
+        if count_tokens(prompt) <= limit:
+            return prompt
+    room = limit - count_tokens(question) - 2
+    if room >= MIN_CHUNK_TOKENS:
+        return truncate_to_tokens(compact(instructions), room) + "\n\n" + question
+    return truncate_to_tokens(question, limit)
+
+
+def get_history_tokens(prompt: str) -> int:
+    """History budget for a prompt: CHAT_HISTORY_TOKENS at most, PROMPT_HISTORY_SHARE of the
+    window at most, and never eating into the retrieved chunks' minimum"""
+    available = available_tokens()
+    left = available - count_tokens(DEFAULT_TEXT_QA_PROMPT_TMPL) - get_min_context_tokens() - count_tokens(prompt)
+    return max(0, min(
+        int(os.getenv("CHAT_HISTORY_TOKENS", "1024")),
+        int(available * float(os.getenv("PROMPT_HISTORY_SHARE", "0.25"))),
+        left
+    ))
+
+
+class TokenBudgetPostprocessor(BaseNodePostprocessor):
+    """Keeps retrieved chunks, best first, until the prompt would overflow one call.
+
+    The question (with its history) and the QA template are counted first and
+    the chunks get the rest of the window, so the response synthesizer never
+    has to split the context into refine calls. The last chunk that only
+    partly fits is truncated, or dropped when too little of it would remain.
+    """
+
+    template: str = DEFAULT_TEXT_QA_PROMPT_TMPL
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenBudgetPostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        query_str = query_bundle.query_str if query_bundle is not None else ""
+        budget = available_tokens() - count_tokens(self.template) - count_tokens(query_str)
+        ordered = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+        kept = []
+        for node in ordered:
+            # Counted as the synthesizer sends it, metadata included; chunks are joined with a blank line
+            tokens = count_tokens(node.node.get_content(metadata_mode=MetadataMode.LLM)) + 2
+            if tokens <= budget:
+                kept.append(node)
+                budget -= tokens
+                continue
+            room = budget - (tokens - count_tokens(node.node.get_content()))
+            while room >= MIN_CHUNK_TOKENS:
+                truncated = TextNode(text=truncate_to_tokens(node.node.get_content(), room),
+                                     id_=node.node.node_id, metadata=node.node.metadata,
+                                     excluded_llm_metadata_keys=node.node.excluded_llm_metadata_keys)
+                # Text and metadata can tokenize a little differently once joined
+                overflow = count_tokens(truncated.get_content(metadata_mode=MetadataMode.LLM)) + 2 - budget
+                if overflow <= 0:
+                    kept.append(NodeWithScore(node=truncated, score=node.score))
+                    break
+                room -= overflow
+            break
+        return kept
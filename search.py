@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core import Settings # type: ignore
+
+import metrics
+
+META_FILE = "meta.json"
+CANDIDATES_FILE = "candidates.jsonl"
+VECTORS_FILE = "vectors.f32"
+CENTROIDS_FILE = "centroids.npy"
+
+# Spherical k-means rounds when (re)training the coarse quantizer
+KMEANS_ITERATIONS = 10
+# Rows sampled per centroid to train on, which bounds training time on a large pool
+KMEANS_SAMPLE_PER_LIST = 64
+
+candidate_index = None
+candidate_index_lock = threading.Lock()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def train_centroids(vectors: np.ndarray, list_count: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors, trained on a sample"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), list_count * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, list_count, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=list_count)
+        # An empty list is reseeded from a random sample row rather than left dead
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Nearest centroid of every vector, computed in batches to bound memory"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        lists[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return lists
+
+
+class CandidateIndex:
+    """Every ingested resume's chunk vectors, searched per candidate without the LLM.
+
+    Chunks are appended as resumes are ingested and kept on disk as an
+    append-only float32 file plus one JSON line per candidate, so adding a
+    resume never rewrites the pool. Vectors are unit length, so a dot product
+    is the cosine similarity.
+
+    Once the pool has ivf_min_chunks chunks an inverted-file (IVF) index is
+    trained: chunks are bucketed by their nearest of about sqrt(n) centroids
+    and a query only scores the chunks in its nprobe nearest buckets. New
+    chunks are bucketed as they arrive; the centroids are retrained whenever
+    the pool has doubled since they were last trained. Smaller pools are
+    scanned exactly. A candidate's score is its best chunk's score.
+    """
+
+    def __init__(self, index_dir: Optional[str], model_name: str,
+                 nprobe: int = 8, ivf_min_chunks: int = 4096):
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.nprobe = nprobe
+        self.ivf_min_chunks = ivf_min_chunks
+        self.dim: Optional[int] = None
+        self.keys: Dict[str, int] = {}
+        self.candidate_keys: List[str] = []
+        self.names: List[str] = []
+        self.size = 0
+        # Grown by doubling so appends are amortized O(1) and searches never copy the pool
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._candidates = np.zeros(0, dtype=np.int32)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_on = 0
+        self._lock = threading.Lock()
+        if index_dir is not None:
+            os.makedirs(index_dir, exist_ok=True)
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.index_dir, file_name)
+
+    def _load(self) -> None:
+        meta_path = self._path(META_FILE)
+        if not os.path.isfile(meta_path):
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model_name") != self.model_name:
+            # Vectors from another embedding model can't be compared with new queries
+            print(f"Search index was built with {meta.get('model_name')}, starting a new one for {self.model_name}")
+            for file_name in (META_FILE, CANDIDATES_FILE, VECTORS_FILE, CENTROIDS_FILE):
+                if os.path.exists(self._path(file_name)):
+                    os.remove(self._path(file_name))
+            return
+
+        self.dim = meta["dim"]
+        vectors = np.fromfile(self._path(VECTORS_FILE), dtype=np.float32) if os.path.isfile(
+            self._path(VECTORS_FILE)) else np.zeros(0, dtype=np.float32)
+        stored_rows = len(vectors) // self.dim
+
+        lines = []
+        if os.path.isfile(self._path(CANDIDATES_FILE)):
+            with open(self._path(CANDIDATES_FILE), encoding="utf-8") as f:
+                lines = f.readlines()
+        candidates, rows = [], 0
+        for line in lines:
+            try:
+                candidate = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            # A crash between writing vectors and their candidate line loses that resume only
+            if rows + candidate["chunks"] > stored_rows:
+                break
+            candidates.append(candidate)
+            rows += candidate["chunks"]
+        if rows != stored_rows or len(candidates) != len(lines):
+            self._rewrite(candidates, rows)
+
+        self._reserve(rows)
+        self._vectors[:rows] = vectors[:rows * self.dim].reshape(rows, self.dim)
+        for candidate in candidates:
+            candidate_id = len(self.names)
+            self.keys[candidate["key"]] = candidate_id
+            self.candidate_keys.append(candidate["key"])
+            self.names.append(candidate["name"])
+            self._candidates[self.size:self.size + candidate["chunks"]] = candidate_id
+            self.size += candidate["chunks"]
+
+        if os.path.isfile(self._path(CENTROIDS_FILE)):
+            centroids = np.load(self._path(CENTROIDS_FILE))
+            if centroids.shape[1] == self.dim:
+                self.centroids = centroids
+                self.trained_on = self.size
+                self._lists[:self.size] = assign_lists(self._vectors[:self.size], centroids)
+        self._maybe_train()
+        print(f"Loaded search index with {len(self.names)} resumes and {self.size} chunks")
+
+    def _rewrite(self, candidates: List[Dict], rows: int) -> None:
+        """Drop a partially written tail left behind by a crash"""
+        with open(self._path(VECTORS_FILE), "ab") as f:
+            f.truncate(rows * self.dim * 4)
+        with open(self._path(CANDIDATES_FILE), "w", encoding="utf-8") as f:
+            for candidate in candidates:
+                f.write(json.dumps(candidate) + "\n")
+
+    def _reserve(self, rows: int) -> None:
+        if rows <= len(self._vectors) and self._vectors.shape[1] == self.dim:
+            return
+        capacity = max(rows, 2 * len(self._vectors), 1024)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        candidates = np.zeros(capacity, dtype=np.int32)
+        lists = np.zeros(capacity, dtype=np.int32)
+        if self.size:
+            vectors[:self.size] = self._vectors[:self.size]
+            candidates[:self.size] = self._candidates[:self.size]
+            lists[:self.size] = self._lists[:self.size]
+        self._vectors, self._candidates, self._lists = vectors, candidates, lists
+
+    def add(self, key: str, name: str, embeddings: List[List[float]]) -> bool:
+        """Add one resume's chunk embeddings; False if it is already in the pool"""
+        if len(embeddings) == 0:
+            return False
+        matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if key in self.keys:
+                return False
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                if self.index_dir is not None:
+                    with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+                        json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding size {matrix.shape[1]} does not match the search index ({self.dim})")
+
+            if self.index_dir is not None:
+                # Vectors first: a candidate line is only ever written once its vectors are on disk
+                with open(self._path(VECTORS_FILE), "ab") as f:
+                    matrix.tofile(f)
+                with open(self._path(CANDIDATES_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "name": name, "chunks": len(matrix)}) + "\n")
+
+            start, end = self.size, self.size + len(matrix)
+            self._reserve(end)
+            self._vectors[start:end] = matrix
+            self._candidates[start:end] = len(self.names)
+            if self.centroids is not None:
+                self._lists[start:end] = assign_lists(matrix, self.centroids)
+            self.keys[key] = len(self.names)
+            self.candidate_keys.append(key)
+            self.names.append(name)
+            self.size = end
+            self._maybe_train()
+        return True
+
+    def _maybe_train(self) -> None:
+        if self.size < self.ivf_min_chunks or (self.centroids is not None and self.size < 2 * self.trained_on):
+            return
+        list_count = int(np.clip(np.sqrt(self.size), 16, 4096))
+        centroids = train_centroids(self._vectors[:self.size], list_count)
+        # Searches may hold the old lists, so they are replaced rather than updated in place
+        lists = np.zeros_like(self._lists)
+        lists[:self.size] = assign_lists(self._vectors[:self.size], centroids)
+        self.centroids, self._lists = centroids, lists
+        self.trained_on = self.size
+        if self.index_dir is not None:
+            np.save(self._path(CENTROIDS_FILE), self.centroids)
+        print(f"Trained search index with {list_count} lists on {self.size} chunks")
+
+    def search(self, query_embedding: List[float], top_k: int = 20) -> List[Tuple[str, str, float]]:
+        """Best (key, file name, score) candidates for a query embedding.
+
+        The key is the candidate's ingest artifact key, which tells apart two
+        different files with the same name and matches its /profiles entry.
+        """
+        with self._lock:
+            # The arrays are only replaced, never shrunk, so these views stay valid after the lock
+            size, centroids = self.size, self.centroids
+            vectors = self._vectors[:size]
+            candidates = self._candidates[:size]
+            lists = self._lists[:size]
+            names = list(self.names)
+            keys = list(self.candidate_keys)
+        if not size:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        if centroids is not None:
+            probe = np.argpartition(-(centroids @ query), min(self.nprobe, len(centroids)) - 1)[:self.nprobe]
+            rows = np.flatnonzero(np.isin(lists, probe))
+            scores = vectors[rows] @ query
+            candidates = candidates[rows]
+        else:
+            scores = vectors @ query
+
+        best = np.full(len(names), -np.inf, dtype=np.float32)
+        np.maximum.at(best, candidates, scores)
+        found = np.flatnonzero(best > -np.inf)
+        top_k = min(top_k, len(found))
+        if not top_k:
+            return []
+        top = found[np.argpartition(-best[found], top_k - 1)[:top_k]]
+        top = top[np.argsort(-best[top])]
+        return [(keys[i], names[i], float(best[i])) for i in top]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"resumes": len(self.names), "chunks": self.size,
+                    "lists": 0 if self.centroids is None else len(self.centroids)}
+
+
+def get_candidate_index() -> CandidateIndex:
+    """The process-wide resume pool, loaded from SEARCH_INDEX_DIR on first use"""
+    global candidate_index
+    with candidate_index_lock:
+        if candidate_index is None:
+            candidate_index = CandidateIndex(
+                os.getenv("SEARCH_INDEX_DIR", "search_index") or None,
+                model_name=getattr(Settings.embed_model, "model_name", "unknown"),
+                nprobe=int(os.getenv("SEARCH_NPROBE", "8")),
+                ivf_min_chunks=int(os.getenv("SEARCH_IVF_MIN_CHUNKS", "4096"))
+            )
+        return candidate_index
+
+
+def search_candidates(query: str, top_k: int = 20) -> List[Dict[str, object]]:
+    """Rank every resume in the pool against a free-text query"""
+    index = get_candidate_index()
+    with metrics.timed("search"):
+        query_embedding = Settings.embed_model.get_query_embedding(query)
+        ranked = index.search(query_embedding, top_k)
+    return [{"key": key, "file_name": name, "score": round(score, 4)} for key, name, score in ranked]
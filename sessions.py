@@ -0,0 +1,421 @@
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from llama_index.core import VectorStoreIndex # type: ignore
+from llama_index.core.query_engine import RetrieverQueryEngine # type: ignore
+from llama_index.core.response_synthesizers import ResponseMode # type: ignore
+from llama_index.core.schema import BaseNode, Document # type: ignore
+
+from comparison import ComparisonQueryEngine, get_comparison_mode
+from hybrid import BM25Index, HybridRetriever, get_hybrid_alpha, get_retrieval_mode, get_retrieval_top_k
+from prompts import TokenBudgetPostprocessor
+from ingest import artifact_key, build_index, get_display_name, ingest_files
+import storage
+
+DEFAULT_SESSION_ID = "default"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Seconds between sweeps for persisted sessions past their storage TTL
+STORAGE_SWEEP_INTERVAL = 600.0
+
+
+class SessionMemoryError(Exception):
+    """Raised when adding documents would push a session past its memory cap"""
+
+
+def estimate_nodes_bytes(nodes: List[BaseNode]) -> int:
+    """Rough in-memory footprint of embedded nodes held by a session.
+
+    Every node is indexed twice (per-file and combined index); a Python float
+    in an embedding list costs about 32 bytes including the list slot.
+    """
+    total = 0
+    for node in nodes:
+        total += len(node.get_content()) + 32 * len(node.embedding or [])
+    return 2 * total
+
+
+class Session:
+    """Document store and query engine belonging to a single analyst"""
+
+    def __init__(self, session_id: str, storage_dir: Optional[str] = None,
+                 max_bytes: Optional[int] = None,
+                 on_files_changed: Optional[Callable[["Session", Set[str]], None]] = None):
+        self.session_id = session_id
+        self.storage_dir = storage_dir
+        self.max_bytes = max_bytes
+        # Told the session's upload paths whenever its documents change
+        self.on_files_changed = on_files_changed
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+        self.memory_bytes = 0
+        self.query_engine = None
+        self.storage_loaded = False
+        self.doc_store = {
+            "documents": {},  # Map file names to Document objects
+            "nodes": {},      # Map file names to embedded nodes
+            "indices": {},    # Map file names to indices
+            "combined_index": None,  # For all documents combined
+            "sparse_index": BM25Index()  # BM25 over the same chunks as the combined index
+        }
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    def ensure_storage_loaded(self) -> None:
+        """Load this session's persisted indices on first use"""
+        if self.storage_loaded or self.storage_dir is None:
+            return
+        self.storage_loaded = True
+
+        persisted = storage.load_all(self.storage_dir)
+        for display_name, (documents, nodes) in persisted.items():
+            self.store_document(display_name, documents, nodes)
+        if persisted:
+            self.query_engine = self.get_combined_query_engine()
+            print(f"Loaded {len(persisted)} persisted documents from {self.storage_dir}")
+
+    def store_document(self, display_name: str, documents: List[Document],
+                       nodes: List[BaseNode]) -> None:
+        """Register already embedded documents in the store and the combined index"""
+        doc_store = self.doc_store
+        doc_store["documents"][display_name] = documents
+        doc_store["nodes"][display_name] = nodes
+        doc_store["indices"][display_name] = build_index(nodes)
+
+        if doc_store["combined_index"] is None:
+            doc_store["combined_index"] = build_index(nodes)
+        else:
+            doc_store["combined_index"].insert_nodes(nodes)
+        doc_store["sparse_index"].add_nodes(nodes)
+        self.memory_bytes += estimate_nodes_bytes(nodes)
+        self.files_changed()
+
+    def is_same_file(self, display_name: str, file_path: str) -> bool:
+        """Whether the stored document of this name has the same artifact key as file_path"""
+        existing = self.doc_store["documents"][display_name][0].metadata.get("file_path")
+        if existing == file_path:
+            return True
+        try:
+            return artifact_key(existing, display_name) == artifact_key(file_path, display_name)
+        except (OSError, TypeError):
+            return False
+
+    def assign_names(self, file_paths: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Give every file a display name of its own, e.g. a second Resume.pdf becomes Resume (2).pdf.
+
+        A name is only reused for the same file (same artifact key), which then
+        replaces the stored copy; the same file twice in one batch is ingested once.
+        """
+        batch: Dict[str, str] = {}
+        named = []
+        for file_path, original_name in file_paths:
+            display_name = get_display_name(original_name)
+            stem, extension = os.path.splitext(display_name)
+            name, copy = display_name, 1
+            while True:
+                if name in batch:
+                    same = batch[name] == file_path
+                elif name in self.doc_store["documents"]:
+                    same = self.is_same_file(name, file_path)
+                else:
+                    break
+                if same:
+                    break
+                copy += 1
+                name = f"{stem} ({copy}){extension}"
+            if batch.get(name) == file_path:
+                continue
+            batch[name] = file_path
+            named.append((file_path, name))
+        return named
+
+    def add_documents(self, file_paths: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Ingest several files through the parallel parse pipeline.
+
+        Files that fail to parse or time out are reported under "failed" instead of
+        aborting the batch; "timings" has the per-stage seconds for every file.
+        "added" has the display names the files were stored under.
+        """
+        self.ensure_storage_loaded()
+        added, failed, timings = [], {}, {}
+        for result in ingest_files(self.assign_names(file_paths)):
+            display_name = result["name"]
+            timings[display_name] = {stage: round(seconds, 3) for stage, seconds in result["timings"].items()}
+            if "error" in result:
+                failed[display_name] = result["error"]
+                print(f"Failed to ingest {display_name}: {result['error']}")
+                continue
+            self.add_ingested(display_name, result["documents"], result["nodes"])
+            added.append(display_name)
+            print(f"Ingested {display_name}: " + ", ".join(
+                f"{stage} {seconds:.2f}s" for stage, seconds in result["timings"].items()))
+
+        self.query_engine = self.get_combined_query_engine()
+        return {"added": added, "failed": failed, "timings": timings}
+
+    def add_ingested(self, display_name: str, documents: List[Document],
+                     nodes: List[BaseNode]) -> None:
+        """Store and persist an already parsed and embedded file, replacing any copy of that name"""
+        self.ensure_storage_loaded()
+
+        # Replace an existing copy of the same file rather than duplicating its chunks;
+        # add_documents only reuses a name for the same file
+        if display_name in self.doc_store["documents"]:
+            self.remove_document(display_name)
+
+        added_bytes = estimate_nodes_bytes(nodes)
+        if self.max_bytes is not None and self.memory_bytes + added_bytes > self.max_bytes:
+            raise SessionMemoryError(
+                f"Adding {display_name} would exceed the session memory limit "
+                f"of {self.max_bytes // (1024 * 1024)} MB"
+            )
+
+        self.store_document(display_name, documents, nodes)
+        if self.storage_dir is not None:
+            storage.persist_file(self.storage_dir, display_name, documents, nodes)
+
+    def remove_document(self, display_name: str) -> None:
+        """Delete one file's documents from the live document store"""
+        self.ensure_storage_loaded()
+        doc_store = self.doc_store
+        if display_name not in doc_store["documents"]:
+            raise KeyError(display_name)
+
+        documents = doc_store["documents"].pop(display_name)
+        nodes = doc_store["nodes"].pop(display_name, [])
+        doc_store["indices"].pop(display_name, None)
+        doc_store["sparse_index"].remove_nodes([node.node_id for node in nodes])
+        self.memory_bytes = max(0, self.memory_bytes - estimate_nodes_bytes(nodes))
+
+        if doc_store["combined_index"] is not None:
+            for doc in documents:
+                doc_store["combined_index"].delete_ref_doc(doc.doc_id, delete_from_docstore=True)
+
+        if not doc_store["documents"]:
+            doc_store["combined_index"] = None
+        if self.storage_dir is not None:
+            storage.delete_file(self.storage_dir, display_name)
+        self.query_engine = self.get_combined_query_engine()
+        self.files_changed()
+
+    def reset(self) -> None:
+        """Drop every document in this session, including persisted copies"""
+        self.storage_loaded = True
+        if self.storage_dir is not None:
+            storage.clear(self.storage_dir)
+        self.doc_store["documents"] = {}
+        self.doc_store["nodes"] = {}
+        self.doc_store["indices"] = {}
+        self.doc_store["combined_index"] = None
+        self.doc_store["sparse_index"] = BM25Index()
+        self.memory_bytes = 0
+        self.query_engine = None
+        self.files_changed()
+
+    def files_changed(self) -> None:
+        if self.on_files_changed is not None:
+            self.on_files_changed(self, set(self.file_paths()))
+
+    def file_paths(self) -> List[str]:
+        """Paths of the uploaded files backing this session's documents"""
+        paths = set()
+        for documents in self.doc_store["documents"].values():
+            for doc in documents:
+                if doc.metadata.get("file_path"):
+                    paths.add(doc.metadata["file_path"])
+        return sorted(paths)
+
+    def get_combined_query_engine(self, streaming: bool = False):
+        """Query engine over every document currently in the store"""
+        doc_store = self.doc_store
+        if doc_store["combined_index"] is None:
+            return VectorStoreIndex(nodes=[]).as_query_engine(streaming=streaming)
+        hybrid = get_retrieval_mode() == "hybrid"
+        if len(doc_store["documents"]) > 1 and get_comparison_mode() == "retrieval":
+            return ComparisonQueryEngine(
+                index=doc_store["combined_index"],
+                file_names=list(doc_store["documents"].keys()),
+                chunks_per_file=int(os.getenv("COMPARISON_CHUNKS_PER_FILE", "2")),
+                sparse_index=doc_store["sparse_index"] if hybrid else None,
+                streaming=streaming
+            )
+        response_mode = ResponseMode.TREE_SUMMARIZE if len(doc_store["documents"]) > 1 else ResponseMode.COMPACT
+        # Retrieved chunks are trimmed to what fits beside the question, so the answer is one LLM call
+        node_postprocessors = [TokenBudgetPostprocessor()]
+        if hybrid:
+            retriever = HybridRetriever(
+                doc_store["combined_index"], doc_store["sparse_index"],
+                top_k=get_retrieval_top_k(), alpha=get_hybrid_alpha()
+            )
+            return RetrieverQueryEngine.from_args(retriever, response_mode=response_mode, streaming=streaming,
+                                                  node_postprocessors=node_postprocessors)
+        return doc_store["combined_index"].as_query_engine(
+            similarity_top_k=get_retrieval_top_k(),
+            response_mode=response_mode,
+            node_postprocessors=node_postprocessors,
+            streaming=streaming
+        )
+
+    def get_query_engine(self):
+        """Current query engine, creating an empty one for a fresh session"""
+        self.ensure_storage_loaded()
+        if self.query_engine is None:
+            self.query_engine = self.get_combined_query_engine()
+        return self.query_engine
+
+
+class SessionRegistry:
+    """Bounded set of live sessions with idle expiry and LRU eviction.
+
+    Sessions idle for longer than idle_ttl seconds are dropped, and once more
+    than max_sessions are live the least recently used one is evicted. With a
+    storage directory configured, evicted sessions reload from disk on their
+    next request instead of losing their documents, until they have gone
+    unused for storage_ttl seconds; a background sweep then deletes their
+    directory. A persisted session's directory mtime marks its last use.
+
+    The upload paths each live session uses are kept here as well, so
+    deciding whether an upload can be deleted never waits on a session
+    that is busy ingesting or querying.
+    """
+
+    def __init__(self, storage_dir: Optional[str] = None, max_sessions: int = 32,
+                 idle_ttl: float = 3600.0, max_session_bytes: Optional[int] = None,
+                 storage_ttl: Optional[float] = None):
+        self.storage_dir = storage_dir
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_session_bytes = max_session_bytes
+        self.storage_ttl = storage_ttl
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._file_paths: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep: Optional[float] = None
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """Return the session for an ID, creating or reloading it if needed"""
+        session_id = session_id or DEFAULT_SESSION_ID
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"Invalid session ID: {session_id}")
+
+        with self._lock:
+            self._expire_idle()
+            sweep = self._sweep_due()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session_dir = None
+                if self.storage_dir is not None:
+                    session_dir = os.path.join(self.storage_dir, session_id)
+                session = Session(session_id, session_dir, self.max_session_bytes,
+                                  on_files_changed=self._track_files)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.touch()
+
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self._file_paths.pop(evicted_id, None)
+                self._mark_used(evicted_id)
+                print(f"Evicted least recently used session {evicted_id}")
+        if sweep:
+            threading.Thread(target=self.sweep_storage, daemon=True).start()
+        return session
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._file_paths.pop(session_id, None)
+
+    def _track_files(self, session: Session, paths: Set[str]) -> None:
+        with self._lock:
+            # A session that was already evicted or dropped no longer holds on to its files
+            if self._sessions.get(session.session_id) is session:
+                self._file_paths[session.session_id] = paths
+
+    def file_paths(self) -> Set[str]:
+        """Paths of the uploaded files backing any live session's documents"""
+        with self._lock:
+            return set().union(*self._file_paths.values())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "documents": sum(len(s.doc_store["documents"]) for s in self._sessions.values()),
+                "memory_bytes": sum(s.memory_bytes for s in self._sessions.values())
+            }
+
+    def sweep_storage(self) -> int:
+        """Delete the persisted indices of sessions that are not live and were last
+        used more than storage_ttl seconds ago; returns how many were deleted"""
+        if self.storage_dir is None or self.storage_ttl is None or not os.path.isdir(self.storage_dir):
+            return 0
+        cutoff = time.time() - self.storage_ttl
+        removed = 0
+        for session_id in os.listdir(self.storage_dir):
+            session_dir = os.path.join(self.storage_dir, session_id)
+            if not SESSION_ID_PATTERN.match(session_id) or not os.path.isdir(session_dir):
+                continue
+            # Moved aside under the lock so a request can't start loading it halfway through the delete
+            expired_dir = os.path.join(self.storage_dir, f".{session_id}.expired")
+            with self._lock:
+                if session_id in self._sessions:
+                    continue
+                try:
+                    if os.path.getmtime(session_dir) > cutoff:
+                        continue
+                    shutil.rmtree(expired_dir, ignore_errors=True)
+                    os.rename(session_dir, expired_dir)
+                except OSError:
+                    continue
+            shutil.rmtree(expired_dir, ignore_errors=True)
+            removed += 1
+        if removed:
+            print(f"Deleted {removed} persisted sessions unused for over {self.storage_ttl:.0f}s")
+        return removed
+
+    def _sweep_due(self) -> bool:
+        if self.storage_dir is None or self.storage_ttl is None:
+            return False
+        now = time.monotonic()
+        if self._last_sweep is not None and now - self._last_sweep < STORAGE_SWEEP_INTERVAL:
+            return False
+        self._last_sweep = now
+        return True
+
+    def _mark_used(self, session_id: str) -> None:
+        """Start a persisted session's storage TTL from when it stopped being live"""
+        if self.storage_dir is None:
+            return
+        try:
+            os.utime(os.path.join(self.storage_dir, session_id))
+        except OSError:
+            pass
+
+    def _expire_idle(self) -> None:
+        now = time.monotonic()
+        expired = [session_id for session_id, session in self._sessions.items()
+                   if now - session.last_used > self.idle_ttl]
+        for session_id in expired:
+            del self._sessions[session_id]
+            self._file_paths.pop(session_id, None)
+            self._mark_used(session_id)
+            print(f"Expired idle session {session_id}")
+
+
+def get_session_registry(storage_dir: Optional[str] = None) -> SessionRegistry:
+    """Build the session registry from environment settings"""
+    max_session_mb = os.getenv("SESSION_MAX_MB")
+    storage_ttl = os.getenv("SESSION_STORAGE_TTL_SECONDS", "604800")
+    return SessionRegistry(
+        storage_dir=storage_dir,
+        max_sessions=int(os.getenv("SESSION_MAX_COUNT", "32")),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600")),
+        max_session_bytes=int(float(max_session_mb) * 1024 * 1024) if max_session_mb else None,
+        storage_ttl=float(storage_ttl) if storage_ttl else None
+    )
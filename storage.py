@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode, Document # type: ignore
+from llama_index.core.storage.docstore import SimpleDocumentStore # type: ignore
+
+DOCSTORE_FILE = "docstore.json"
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+def get_storage_dir() -> Optional[str]:
+    """Directory for persistent indices, or None when running purely in memory"""
+    return os.getenv("INDEX_STORAGE_DIR") or None
+
+
+def _file_dir(storage_dir: str, display_name: str) -> str:
+    digest = hashlib.sha1(display_name.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(storage_dir, digest)
+
+
+def persist_file(storage_dir: str, display_name: str,
+                 documents: List[Document], nodes: List[BaseNode]) -> None:
+    """Write one file's documents, chunks and vectors to disk.
+
+    Documents and chunk text go into a docstore; the chunk vectors go into a
+    float32 .npy matrix so they can be read back without re-embedding.
+    """
+    file_dir = _file_dir(storage_dir, display_name)
+    os.makedirs(file_dir, exist_ok=True)
+
+    docstore = SimpleDocumentStore()
+    docstore.add_documents(documents)
+    docstore.add_documents([node.model_copy(update={"embedding": None}) for node in nodes])
+    docstore.persist(os.path.join(file_dir, DOCSTORE_FILE))
+
+    vectors = np.asarray([node.embedding for node in nodes], dtype=np.float32)
+    np.save(os.path.join(file_dir, VECTORS_FILE), vectors)
+
+    with open(os.path.join(file_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "file_name": display_name,
+            "document_ids": [doc.doc_id for doc in documents],
+            "node_ids": [node.node_id for node in nodes]
+        }, f)
+
+
+def load_file(file_dir: str) -> Tuple[str, List[Document], List[BaseNode]]:
+    """Read one persisted file back as documents and embedded nodes"""
+    with open(os.path.join(file_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    docstore = SimpleDocumentStore.from_persist_path(os.path.join(file_dir, DOCSTORE_FILE))
+    # Read in one go: the index needs every vector as a list anyway, so mapping the file saves nothing
+    vectors = np.load(os.path.join(file_dir, VECTORS_FILE))
+
+    documents = [docstore.get_document(doc_id) for doc_id in manifest["document_ids"]]
+    nodes = []
+    for row, node_id in enumerate(manifest["node_ids"]):
+        node = docstore.get_node(node_id)
+        node.embedding = vectors[row].tolist()
+        nodes.append(node)
+
+    return manifest["file_name"], documents, nodes
+
+
+def load_named(storage_dir: str, display_name: str) -> Optional[Tuple[List[Document], List[BaseNode]]]:
+    """Load one persisted file by name, or None if it isn't there"""
+    file_dir = _file_dir(storage_dir, display_name)
+    if not os.path.isfile(os.path.join(file_dir, MANIFEST_FILE)):
+        return None
+    _, documents, nodes = load_file(file_dir)
+    return documents, nodes
+
+
+def load_all(storage_dir: str) -> Dict[str, Tuple[List[Document], List[BaseNode]]]:
+    """Load every persisted file under the storage directory"""
+    loaded = {}
+    if not os.path.isdir(storage_dir):
+        return loaded
+
+    for entry in sorted(os.listdir(storage_dir)):
+        file_dir = os.path.join(storage_dir, entry)
+        if not os.path.isfile(os.path.join(file_dir, MANIFEST_FILE)):
+            continue
+        try:
+            display_name, documents, nodes = load_file(file_dir)
+            loaded[display_name] = (documents, nodes)
+        except Exception as e:
+            print(f"Skipping unreadable index at {file_dir}: {str(e)}")
+    return loaded
+
+
+def delete_file(storage_dir: str, display_name: str) -> None:
+    """Remove one file's persisted index"""
+    shutil.rmtree(_file_dir(storage_dir, display_name), ignore_errors=True)
+
+
+def clear(storage_dir: str) -> None:
+    """Remove every persisted index"""
+    if not os.path.isdir(storage_dir):
+        return
+    for entry in os.listdir(storage_dir):
+        file_dir = os.path.join(storage_dir, entry)
+        if os.path.isfile(os.path.join(file_dir, MANIFEST_FILE)):
+            shutil.rmtree(file_dir, ignore_errors=True)
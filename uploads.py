@@ -0,0 +1,129 @@
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import UploadFile
+
+import metrics
+
+CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload or a whole request exceeds the configured size limit"""
+
+
+class UploadStore:
+    """Content-addressed store for uploaded files.
+
+    Uploads are streamed to disk in chunks while their SHA-256 is computed and
+    kept once per content under <hash>/<file name>, so the same resume uploaded
+    ten times is stored once and two different uploads can never overwrite each
+    other. The same content under another name is hard-linked, not copied.
+    Files are pinned while a request is using them and only deleted once
+    unpinned and no longer referenced by anything the caller says is in use.
+    """
+
+    def __init__(self, upload_dir: str, max_file_bytes: int, max_request_bytes: int):
+        self.upload_dir = upload_dir
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def check_content_length(self, content_length: Optional[str]) -> None:
+        """Reject an oversized request from its Content-Length before the body is read"""
+        if content_length and content_length.isdigit() and int(content_length) > self.max_request_bytes:
+            raise UploadTooLargeError(
+                f"Request is larger than the {self.max_request_bytes // (1024 * 1024)} MB upload limit"
+            )
+
+    async def save(self, upload: UploadFile) -> Tuple[str, str]:
+        """Stream an upload into the store and pin it; returns (file_path, original file name)"""
+        file_name = os.path.basename(upload.filename or "")
+        # "." or ".." would name the content directory (or the upload directory) itself
+        if file_name in ("", ".", ".."):
+            file_name = "upload"
+        digest = hashlib.sha256()
+        size = 0
+        with metrics.timed("save_upload"):
+            fd, temp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as buffer:
+                    while True:
+                        chunk = await upload.read(CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > self.max_file_bytes:
+                            raise UploadTooLargeError(
+                                f"{upload.filename} is larger than the "
+                                f"{self.max_file_bytes // (1024 * 1024)} MB file limit"
+                            )
+                        digest.update(chunk)
+                        buffer.write(chunk)
+
+                content_dir = os.path.join(self.upload_dir, digest.hexdigest()[:32])
+                file_path = os.path.join(content_dir, file_name)
+                with self._lock:
+                    if not os.path.isfile(file_path):
+                        os.makedirs(content_dir, exist_ok=True)
+                        existing = os.listdir(content_dir)
+                        try:
+                            if not existing:
+                                raise OSError("nothing to link to")
+                            os.link(os.path.join(content_dir, existing[0]), file_path)
+                        except OSError:
+                            os.replace(temp_path, file_path)
+                    # Pinned only once the file is in place, so a failed save leaves no pin behind
+                    self._pins[file_path] = self._pins.get(file_path, 0) + 1
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        metrics.UPLOADED_BYTES.inc(size)
+        return file_path, file_name
+
+    def unpin(self, file_paths: Iterable[str]) -> None:
+        with self._lock:
+            for file_path in file_paths:
+                count = self._pins.get(file_path, 0) - 1
+                if count > 0:
+                    self._pins[file_path] = count
+                else:
+                    self._pins.pop(file_path, None)
+
+    def contains(self, file_path: str) -> bool:
+        """Whether a path is inside the upload directory, after resolving links and ..'s"""
+        root = os.path.realpath(self.upload_dir)
+        return os.path.realpath(file_path).startswith(root + os.sep)
+
+    def delete_unused(self, file_paths: Iterable[str], in_use: Set[str]) -> None:
+        """Delete files that no request has pinned and that are not in in_use.
+
+        Only files inside the upload directory are ever deleted; any other path
+        (say, from a document ingested straight from disk) is left alone.
+        """
+        with self._lock:
+            for file_path in file_paths:
+                if file_path in self._pins or file_path in in_use:
+                    continue
+                if not self.contains(file_path):
+                    print(f"Not deleting {file_path}: it is outside {self.upload_dir}")
+                    continue
+                if os.path.isfile(file_path):
+                    os.remove(file_path)
+                content_dir = os.path.dirname(file_path)
+                if content_dir != self.upload_dir and os.path.isdir(content_dir) and not os.listdir(content_dir):
+                    os.rmdir(content_dir)
+
+
+def get_upload_store(upload_dir: str = "uploaded_files") -> UploadStore:
+    """Build the upload store from environment settings"""
+    return UploadStore(
+        upload_dir,
+        max_file_bytes=int(float(os.getenv("UPLOAD_MAX_FILE_MB", "10")) * 1024 * 1024),
+        max_request_bytes=int(float(os.getenv("UPLOAD_MAX_REQUEST_MB", "200")) * 1024 * 1024)
+    )
@@ -6,10 +6,14 @@ import datetime
 import pandas as pd
 from io import BytesIO
 import os
+import uuid
 
-from api import get_ats_score
+from client import get_ats_scores_batch
 
 # Initialize session state variables first - before anything else
+if "session_id" not in st.session_state:
+    # Identifies this browser session's document store on the backend
+    st.session_state.session_id = uuid.uuid4().hex
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 if "file_uploaded" not in st.session_state:
@@ -40,21 +44,24 @@ def sync_uploaded_files_with_session():
     if not os.path.exists(upload_dir):
         return
         
-    # Get list of files in the directory
-    files_in_directory = os.listdir(upload_dir)
-    
-    # For each file in directory, check if it's in session state
-    for filename in files_in_directory:
-        filepath = os.path.join(upload_dir, filename)
-        if os.path.isfile(filepath):
-            # Handle timestamp prefix in filenames
-            display_name = filename
-            if '_' in filename:
+    # Uploads are stored as <content hash>/<file name>; older ones as <timestamp>_<file name>
+    stored_files = []
+    for entry in os.listdir(upload_dir):
+        entry_path = os.path.join(upload_dir, entry)
+        if os.path.isdir(entry_path):
+            stored_files.extend((os.path.join(entry_path, name), name) for name in os.listdir(entry_path))
+        elif not entry.endswith('.part'):
+            display_name = entry
+            if '_' in entry:
                 # Remove timestamp prefix (e.g., 20250419_111011_)
-                parts = filename.split('_', 2)
+                parts = entry.split('_', 2)
                 if len(parts) >= 3:
                     display_name = parts[2]  # Get the part after the timestamp
-            
+            stored_files.append((entry_path, display_name))
+
+    # For each stored file, check if it's in session state
+    for filepath, display_name in stored_files:
+        if os.path.isfile(filepath):
             # Check if we need to add to session state
             if display_name not in st.session_state.uploaded_files:
                 with open(filepath, 'rb') as f:
@@ -80,52 +87,59 @@ def sync_uploaded_files_with_session():
 
 sync_uploaded_files_with_session()
 
-def send_message(url, message, file_info=None, multiple_files=None):
-    try:
-        data = {
-            "message": message,
-            "chat_history": [
-                {"human": msg["human"], "assistant": msg["assistant"]}
-                for msg in st.session_state.chat_history
-            ]
+def build_chat_request(message, file_info=None, multiple_files=None):
+    """Build the form data and files for a /chat or /chat/stream request"""
+    data = {
+        "message": message,
+        "chat_history": [
+            {"human": msg["human"], "assistant": msg["assistant"]}
+            for msg in st.session_state.chat_history
+        ],
+        "session_id": st.session_state.session_id
+    }
+    files = {}
+    
+    # Handle single file upload
+    if file_info and not multiple_files:
+        files = {
+            "file": (file_info["name"], file_info["content"], file_info["type"])
         }
-        files = {}
-        
-        # Handle single file upload
-        if file_info and not multiple_files:
-            files = {
-                "file": (file_info["name"], file_info["content"], file_info["type"])
-            }
-        
-        # Handle multiple file uploads
-        if multiple_files:
-            for i, file_data in enumerate(multiple_files):
-                files[f"file_{i}"] = (
-                    file_data["name"], 
-                    file_data["content"], 
-                    file_data["type"]
-                )
+    
+    # Handle multiple file uploads
+    if multiple_files:
+        for i, file_data in enumerate(multiple_files):
+            files[f"file_{i}"] = (
+                file_data["name"], 
+                file_data["content"], 
+                file_data["type"]
+            )
+
+    # Send JSON data as a string in the 'data' field
+    return {"data": json.dumps(data)}, files
+
+
+def record_message(message, response):
+    """Append a finished exchange to the current chat"""
+    # Add timestamp to messages
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    new_message = {"human": message, 'assistant': str(response), "timestamp": timestamp}
+    
+    # Add to current chat history
+    st.session_state.chat_history.append(new_message)
+    
+    # Update in all_chats
+    st.session_state.all_chats[st.session_state.current_chat] = st.session_state.chat_history
 
-        # Send JSON data as a string in the 'data' field
-        response = requests.post(
-            f"{url}/chat",
-            data={"data": json.dumps(data)},
-            files=files
-        )
+
+def send_message(url, message, file_info=None, multiple_files=None):
+    try:
+        data, files = build_chat_request(message, file_info, multiple_files)
+        response = requests.post(f"{url}/chat", data=data, files=files)
 
         response.raise_for_status()  # This will raise an exception for HTTP errors
 
         result = response.json()
-        # Add timestamp to messages
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        new_message = {"human": message, 'assistant': str(result["response"]), "timestamp": timestamp}
-        
-        # Add to current chat history
-        st.session_state.chat_history.append(new_message)
-        
-        # Update in all_chats
-        st.session_state.all_chats[st.session_state.current_chat] = st.session_state.chat_history
-        
+        record_message(message, result["response"])
         return result["response"]
     except requests.exceptions.RequestException as e:
         st.error(f"Error: {str(e)}")
@@ -134,6 +148,31 @@ def send_message(url, message, file_info=None, multiple_files=None):
         return "Sorry, there was an error processing your request."
 
 
+def stream_message(url, message, file_info=None, multiple_files=None):
+    """Yield answer tokens from /chat/stream as they arrive, for st.write_stream"""
+    try:
+        data, files = build_chat_request(message, file_info, multiple_files)
+        with requests.post(f"{url}/chat/stream", data=data, files=files, stream=True) as response:
+            response.raise_for_status()
+
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    payload = json.loads(line[len("data:"):].strip())
+                    if event == "token":
+                        yield payload["text"]
+                    elif event == "error":
+                        st.error(f"Error: {payload['detail']}")
+                        return
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error: {str(e)}")
+        if hasattr(e, 'response') and e.response is not None:
+            st.error(f"Response content: {e.response.content}")
+        yield "Sorry, there was an error processing your request."
+
+
 def export_chat_history():
     """Export chat history as a text file"""
     if not st.session_state.chat_history:
@@ -175,7 +214,10 @@ def create_new_chat():
     st.session_state.active_files = []
     
     try:
-        requests.post(f"{st.session_state.backend_url}/new_chat")
+        requests.post(
+            f"{st.session_state.backend_url}/new_chat",
+            params={"session_id": st.session_state.session_id}
+        )
     except:
         pass
 
@@ -453,37 +495,43 @@ with col2:
                         # Update active_files to only include valid files
                         st.session_state.active_files = valid_active_files
                         
-                    # Process each valid file
-                    for resume_name in valid_active_files:
-                        # Skip if already scored
-                        if resume_name in st.session_state.ats_scores:
-                            continue
-                        
+                    # Score every file not scored yet in one concurrent batch
+                    pending_files = [name for name in valid_active_files
+                                     if name not in st.session_state.ats_scores]
+                    if pending_files:
+                        progress = st.progress(0.0, text="Scoring resumes...")
                         try:
-                            # Get the resume data
-                            resume_data = st.session_state.uploaded_files[resume_name]
-                            
-                            # Get the score
-                            score_data = get_ats_score(
+                            results = get_ats_scores_batch(
                                 st.session_state.job_description,
-                                resume_data,
+                                [st.session_state.uploaded_files[name] for name in pending_files],
                                 api_url
                             )
-                            
-                            # Store score data
-                            st.session_state.ats_scores[resume_name] = score_data
-                            
+                            # Store each score as soon as the backend finishes it
+                            for done, (resume_name, score_data) in enumerate(results, start=1):
+                                st.session_state.ats_scores[resume_name] = score_data
+                                progress.progress(
+                                    done / len(pending_files),
+                                    text=f"Scored {done} of {len(pending_files)} resumes"
+                                )
                         except Exception as e:
-                            st.error(f"Error processing {resume_name}: {str(e)}")
+                            st.error(f"Error processing resumes: {str(e)}")
+                        finally:
+                            progress.empty()
             
             # Display scores if available
             if st.session_state.ats_scores:
                 # Create score dataframe
                 score_data = []
                 for name, data in st.session_state.ats_scores.items():
+                    # Fields extracted once at ingest, no LLM involved
+                    profile = data.get("profile") or {}
+                    years = profile.get("years_experience")
                     score_data.append({
                         "Resume": name,
-                        "Match Score": f"{data['score']}%" if data['score'] is not None else "N/A"
+                        "Match Score": f"{data['score']}%" if data['score'] is not None else "N/A",
+                        "Experience": f"{years:g} yrs" if years is not None else "N/A",
+                        "Degree": (profile.get("highest_degree") or "N/A").replace("phd", "PhD").title(),
+                        "Skills": ", ".join(profile.get("skills", [])[:8])
                     })
                     
                 # Convert to DataFrame and sort by score
@@ -547,36 +595,35 @@ with col2:
             with st.chat_message("user"):
                 st.markdown(prompt)
             
-            # Show a spinner while waiting for response
-            with st.spinner("Analyzing..."):
-                # Determine what files to send
-                if len(st.session_state.chat_history) == 0:
-                    if upload_mode == "Multiple Files" and st.session_state.active_files:
-                        # Send multiple files on first message
-                        multiple_files = [
-                            st.session_state.uploaded_files[name] 
-                            for name in st.session_state.active_files
-                        ]
-                        response = send_message(
-                            api_url, 
-                            prompt, 
-                            None, 
-                            multiple_files
-                        )
-                    else:
-                        # Send single file on first message
-                        response = send_message(
-                            api_url, 
-                            prompt, 
-                            st.session_state.file_info
-                        )
+            # Determine what files to send
+            if len(st.session_state.chat_history) == 0:
+                if upload_mode == "Multiple Files" and st.session_state.active_files:
+                    # Send multiple files on first message
+                    multiple_files = [
+                        st.session_state.uploaded_files[name] 
+                        for name in st.session_state.active_files
+                    ]
+                    tokens = stream_message(
+                        api_url, 
+                        prompt, 
+                        None, 
+                        multiple_files
+                    )
                 else:
-                    # After first message, just send the prompt
-                    response = send_message(api_url, prompt)
+                    # Send single file on first message
+                    tokens = stream_message(
+                        api_url, 
+                        prompt, 
+                        st.session_state.file_info
+                    )
+            else:
+                # After first message, just send the prompt
+                tokens = stream_message(api_url, prompt)
             
-            # Display assistant response
+            # Render the assistant response token by token as it streams in
             with st.chat_message("assistant"):
-                st.markdown(response)
+                response = st.write_stream(tokens)
+            record_message(prompt, response)
             
             # Force refresh to show latest messages
             st.rerun()
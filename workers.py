@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator
+
+
+class StageSaturatedError(Exception):
+    """Raised when a stage already has as many requests running and queued as it accepts"""
+
+    def __init__(self, stage: str, queued: int):
+        super().__init__(f"The {stage} stage is busy ({queued} requests queued), please retry shortly")
+        self.stage = stage
+        self.queued = queued
+
+
+class StageLimiter:
+    """Concurrency limit and bounded wait queue for one stage of request handling.
+
+    Blocking work runs on the stage's own thread pool so it never holds up the
+    event loop; async work only takes a slot. Once max_concurrency requests are
+    running and max_queue more are waiting, new requests are refused so callers
+    can answer with 429 instead of piling up behind a slow batch. Counters are
+    only touched from the event loop thread, so they need no lock.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix=f"{name}-worker"
+        )
+
+    def check(self) -> None:
+        """Refuse with StageSaturatedError if a request could not even queue right now"""
+        if self.queued >= self.max_queue and self.active >= self.max_concurrency:
+            raise StageSaturatedError(self.name, self.queued)
+
+    async def acquire(self) -> None:
+        """Wait for a free slot, refusing immediately if the queue is full"""
+        self.check()
+
+        # Created on first use so it binds to the server's running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking function on this stage's thread pool; the caller must hold a slot"""
+        loop = asyncio.get_running_loop()
+        # Carry context variables (e.g. the request's stage timings) into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(context.run, fn, *args, **kwargs))
+
+    async def iterate(self, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+        """Drain a blocking iterator on this stage's thread pool; the caller must hold a slot"""
+        done = object()
+        while True:
+            item = await self.call(next, iterator, done)
+            if item is done:
+                break
+            yield item
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking function on this stage's thread pool"""
+        async with self.slot():
+            return await self.call(fn, *args, **kwargs)
+
+    async def run_async(self, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """Run a coroutine function while holding one of this stage's slots"""
+        async with self.slot():
+            return await fn(*args, **kwargs)
+
+    def capacity(self) -> int:
+        """How many more requests this stage would admit right now"""
+        return max(0, self.max_concurrency + self.max_queue - self.active - self.queued)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
+
+
+def get_stage_limiter(name: str, default_concurrency: int, default_queue: int) -> StageLimiter:
+    """Build a stage limiter sized from <NAME>_CONCURRENCY and <NAME>_QUEUE"""
+    prefix = name.upper()
+    return StageLimiter(
+        name,
+        max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(default_concurrency))),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", str(default_queue)))
+    )